@@ -0,0 +1,345 @@
+"""
+Benchmarks of rendering and input handling
+Output goes to a pseudo terminal (pty) instead of the real one, input is fed through a pipe
+
+    python bench.py             run and compare against bench_baseline.json, exit code 1 on regression
+    python bench.py --update    run and store the results as the new baseline
+    python bench.py --quick     shorter runs (noisier)
+
+Reports frames/sec, bytes/frame, events/sec, operations/sec and peak memory (tracemalloc) per scenario
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import pty
+import struct
+import sys
+import termios
+import threading
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable
+
+from frame import Frame
+from frame_manager import FrameManager
+from input import Input
+from input_parser import MotionCoalescer
+from terminal import Terminal
+
+
+BASELINE_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# metrics which regress when they go down - the others (bytes, memory) regress when they go up
+HIGHER_IS_BETTER: set[str] = {'fps', 'events_per_sec', 'ops_per_sec'}
+
+# allowed change against the baseline before it counts as a regression
+# timings depend on the machine and its load, byte counts don't
+TOLERANCES: dict[str, float] = {
+    'fps': 0.30,
+    'events_per_sec': 0.30,
+    'ops_per_sec': 0.30,
+    'bytes_per_frame': 0.05,
+    'peak_memory': 0.25,
+}
+
+# (rows, columns) of the terminals rendered to
+SIZES: list[tuple[int, int]] = [(24, 80), (50, 200), (100, 300)]
+FRAME_COUNTS: list[int] = [1, 8, 32]
+
+# events per read - a single key press up to a flood of mouse motion
+BURSTS: list[int] = [1, 32, 256]
+
+# frames rendered to measure bytes/frame
+FIXED_FRAMES: int = 100
+
+
+class PseudoTerminal:
+    """ A pty of a given size, everything written to it is read (and counted) by a background thread """
+
+    def __init__(self, rows: int, columns: int) -> None:
+        self.master, self.slave = pty.openpty()
+        fcntl.ioctl(self.slave, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+
+        self.received: int = 0
+        self.thread: threading.Thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                data: bytes = os.read(self.master, 65536)
+            except OSError:
+                return  # closed
+
+            if not data:
+                return
+
+            self.received += len(data)
+
+    def close(self) -> None:
+        os.close(self.slave)
+        os.close(self.master)
+        self.thread.join(1)
+
+
+def best_rate(run: Callable[[int], Any], duration: float, repeats: int = 3) -> float:
+    """
+    Calls of run per second - the best of repeats runs of duration / repeats seconds each
+    The best run is the one least disturbed by other processes
+    run is called with the number of the call
+    """
+
+    best: float = 0
+    count: int = 0
+
+    for repeat in range(repeats):
+        calls: int = 0
+        start: float = perf_counter()
+        while perf_counter() - start < duration / repeats:
+            run(count)
+            count += 1
+            calls += 1
+        best = max(best, calls / (perf_counter() - start))
+
+    return best
+
+
+def peak_memory(run: Callable[[], Any]) -> int:
+    """ Peak amount of bytes allocated while run runs """
+
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def split_frames(frame_manager: FrameManager, count: int) -> None:
+    """ Split the last frame alternately vertically and horizontally until there are count frames """
+
+    while len(frame_manager.frames) < count:
+        frame: Frame = frame_manager.frames[-1]
+        if len(frame_manager.frames) % 2:
+            frame_manager.splitv(frame)
+        else:
+            frame_manager.splith(frame)
+
+    for frame in frame_manager.frames:
+        frame.add_border()
+
+
+def bench_render(rows: int, columns: int, frame_count: int, duration: float) -> dict[str, float]:
+    """
+    Render frames to a pty of rows x columns split into frame_count frames
+    Every frame one row of every frame changes, which is composed (_update_chars), printed and flushed
+    """
+
+    def setup() -> tuple[PseudoTerminal, Terminal, FrameManager]:
+        pseudo_terminal: PseudoTerminal = PseudoTerminal(rows, columns)
+        terminal: Terminal = Terminal(pseudo_terminal.slave, max_fps=float('inf'))
+        frame_manager: FrameManager = FrameManager(terminal)
+        split_frames(frame_manager, frame_count)
+
+        frame_manager.print(full=True, force=True)
+        terminal.flush(block=True)
+
+        return pseudo_terminal, terminal, frame_manager
+
+    def render(frame_manager: FrameManager, count: int) -> None:
+        for frame in frame_manager.frames:
+            if frame.rows > 2 and frame.columns > 2:
+                frame.chars.write(1 + count % (frame.rows - 2), 1, f"frame {count}"[:frame.columns - 2])
+
+        frame_manager._update_chars()
+        frame_manager.print(force=True)
+        frame_manager.terminal.flush(block=True)
+
+    pseudo_terminal, terminal, frame_manager = setup()
+
+    # bytes of a fixed amount of frames, so the result doesn't depend on the speed
+    written: int = frame_manager.total_bytes_written
+    for count in range(FIXED_FRAMES):
+        render(frame_manager, count)
+    bytes_per_frame: float = (frame_manager.total_bytes_written - written) / FIXED_FRAMES
+
+    fps: float = best_rate(lambda count: render(frame_manager, count), duration)
+
+    terminal.close()
+    pseudo_terminal.close()
+
+    # memory of setting up and rendering a few frames, measured separately as tracing slows everything down
+    def traced() -> None:
+        pseudo_terminal, terminal, frame_manager = setup()
+        for count in range(20):
+            render(frame_manager, count)
+        terminal.close()
+        pseudo_terminal.close()
+
+    return {
+        'fps': fps,
+        'bytes_per_frame': bytes_per_frame,
+        'peak_memory': peak_memory(traced),
+    }
+
+
+def bench_layout(rows: int, columns: int, frame_count: int, duration: float) -> dict[str, float]:
+    """ Split a frame manager into frame_count frames and print it once, over and over """
+
+    pseudo_terminal: PseudoTerminal = PseudoTerminal(rows, columns)
+    terminal: Terminal = Terminal(pseudo_terminal.slave, max_fps=float('inf'))
+
+    def run(count: int = 0) -> None:
+        frame_manager: FrameManager = FrameManager(terminal)
+        split_frames(frame_manager, frame_count)
+        frame_manager.print(full=True, force=True)
+        terminal.flush(block=True)
+        terminal.listeners.clear()
+
+    result: dict[str, float] = {'ops_per_sec': best_rate(run, duration), 'peak_memory': peak_memory(run)}
+
+    terminal.close()
+    pseudo_terminal.close()
+
+    return result
+
+
+def bench_frame(rows: int, columns: int, duration: float) -> dict[str, float]:
+    """ Resize a bordered frame between two sizes (which redraws its border) over and over """
+
+    frame: Frame = Frame(rows, columns, (1, 1))
+    frame.add_border()
+    sizes: list[tuple[int, int]] = [(rows // 2, columns // 2), (rows, columns)]
+
+    def run(count: int) -> None:
+        frame.resize(*sizes[count % 2], (1, 1))
+        frame.add_border()
+
+    return {'ops_per_sec': best_rate(run, duration), 'peak_memory': peak_memory(lambda: [run(count) for count in range(20)])}
+
+
+def input_chunk(burst: int) -> tuple[bytes, int]:
+    """ A read worth of input with burst events - mouse motion, clicks and keys mixed """
+
+    events: list[bytes] = []
+    for index in range(burst):
+        kind: int = index % 8
+        if kind < 5:
+            events.append(f"\x1b[<35;{index % 200 + 1};{index % 50 + 1}M".encode())  # motion
+        elif kind == 5:
+            events.append(f"\x1b[<0;{index % 200 + 1};{index % 50 + 1}M".encode())  # press
+        elif kind == 6:
+            events.append(f"\x1b[<0;{index % 200 + 1};{index % 50 + 1}m".encode())  # release
+        else:
+            events.append(b"\x1b[A" if index % 16 == 7 else b"j")  # keys
+
+    chunk: bytes = b''.join(events)
+    if len(chunk) > Input.READ_SIZE:
+        raise ValueError("Burst doesn't fit into a single read")
+
+    return chunk, burst
+
+
+def bench_input(burst: int, duration: float) -> dict[str, float]:
+    """ Feed reads of burst events through a pipe to Input.read_input (parsing, coalescing and dispatching) """
+
+    read_fd, write_fd = os.pipe()
+    input_: Input = Input(MotionCoalescer(MotionCoalescer.NONE), fd=read_fd)
+    input_.keyboard.subscribe('j', lambda: None)
+    chunk, events = input_chunk(burst)
+
+    def run(count: int = 0) -> None:
+        os.write(write_fd, chunk)
+        input_.read_input()
+
+    result: dict[str, float] = {
+        'events_per_sec': best_rate(run, duration) * events,
+        'peak_memory': peak_memory(lambda: [run() for count in range(20)]),
+    }
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+    return result
+
+
+def run_all(duration: float) -> dict[str, dict[str, float]]:
+    """ Run every scenario, returns scenario name -> metrics """
+
+    results: dict[str, dict[str, float]] = {}
+
+    for rows, columns in SIZES:
+        for frame_count in FRAME_COUNTS:
+            results[f"render {rows}x{columns} {frame_count} frames"] = bench_render(rows, columns, frame_count, duration)
+
+    for frame_count in FRAME_COUNTS:
+        results[f"layout 50x200 {frame_count} frames"] = bench_layout(50, 200, frame_count, duration)
+
+    for rows, columns in SIZES:
+        results[f"frame resize {rows}x{columns}"] = bench_frame(rows, columns, duration)
+
+    for burst in BURSTS:
+        results[f"input {burst} events/read"] = bench_input(burst, duration)
+
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], scale: float) -> list[str]:
+    """ Return a description of every metric which regressed against the baseline (tolerances are multiplied by scale) """
+
+    regressions: list[str] = []
+
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            base: float = baseline.get(scenario, {}).get(metric)
+            if not base:
+                continue
+
+            tolerance: float = TOLERANCES[metric] * scale
+            change: float = (value - base) / base
+
+            if (change < -tolerance) if metric in HIGHER_IS_BETTER else (change > tolerance):
+                regressions.append(f"{scenario}: {metric} {value:.1f} vs {base:.1f} ({change:+.0%})")
+
+    return regressions
+
+
+def main() -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="PTTUI rendering and input benchmarks")
+    parser.add_argument('--update', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--quick', action='store_true', help="shorter runs")
+    parser.add_argument('--duration', type=float, default=1.0, help="seconds per scenario")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="multiplier of the allowed regression")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    args: argparse.Namespace = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = run_all(0.2 if args.quick else args.duration)
+
+    for scenario, metrics in results.items():
+        print(f"{scenario:32}", '  '.join(f"{metric} {value:,.1f}" for metric, value in metrics.items()))
+
+    if args.update:
+        with open(args.baseline, 'w') as file:
+            json.dump({scenario: {metric: round(value, 1) for metric, value in metrics.items()} for scenario, metrics in results.items()}, file, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against, run with --update to create one")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline: dict[str, dict[str, float]] = json.load(file)
+
+    regressions: list[str] = compare(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print("REGRESSION", regression, file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+from types import CoroutineType
+from typing import Any, Callable
+
+
+# tasks of running coroutine callbacks, referenced so they aren't garbage collected before finishing
+# (asyncio is imported only once a coroutine callback shows up, it's slow to import)
+tasks: 'set[asyncio.Task]' = set()
+
+
+def invoke(callback: Callable[..., Any], *args: Any) -> Any:
+    """
+    Call a subscribed callback
+    Callbacks may be coroutine functions - their coroutine is scheduled as a task on the running event loop
+    so a slow handler doesn't block input or rendering (without a running loop it's run to completion)
+    """
+
+    result: Any = callback(*args)
+
+    if result is None or not isinstance(result, CoroutineType):
+        return result
+
+    import asyncio
+
+    try:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(result)
+
+    task: asyncio.Task = loop.create_task(result)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+    return task
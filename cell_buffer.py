@@ -0,0 +1,321 @@
+from array import array
+from functools import lru_cache
+from sys import byteorder
+from typing import Iterator
+
+from unicode_width import CLUSTER_BASE, CONTINUATION, cell_text, cell_width, cluster_code, graphemes
+
+
+# typecode of an array holding one unicode code point (4 bytes) per item
+CODE_TYPE: str = 'I' if array('I').itemsize == 4 else 'L'
+
+# codec used to turn a row of code points into a string in one go
+CODEC: str = 'utf-32-le' if byteorder == 'little' else 'utf-32-be'
+
+BLANK: int = ord(' ')
+
+# first code point which can be wide, anything below takes one cell
+FIRST_WIDE: int = 0x1100
+
+
+def decode(codes: array) -> str:
+    """
+    Convert cell codes to the text printed for them
+    Continuations (right halves of wide characters) are left out, cluster references are looked up
+    """
+
+    # fast path - plain code points, decoded in one go
+    if not codes or max(codes) < CLUSTER_BASE:
+        text: str = codes.tobytes().decode(CODEC)
+        return text.replace('\0', '') if '\0' in text else text
+
+    return ''.join([cell_text(code) for code in codes])
+
+
+@lru_cache(maxsize=4096)
+def _cells(text: str) -> tuple[int, ...]:
+    cells: list[int] = []
+
+    for cluster, width in graphemes(text):
+        cells.append(ord(cluster) if len(cluster) == 1 else cluster_code(cluster, width))
+        if width == 2:
+            cells.append(CONTINUATION)
+
+    return tuple(cells)
+
+
+def text_cells(text: str) -> array:
+    """
+    Convert text to cell codes - one per cell, so wide characters are followed by a continuation
+    and grapheme clusters of several code points become a single reference. Cached per string
+    """
+
+    if text.isascii():
+        return array(CODE_TYPE, text.encode(CODEC))
+
+    return array(CODE_TYPE, _cells(text))
+
+
+class CellRow:
+    """
+    Lightweight view of a single row of a CellBuffer
+    Allows the buffer to be used like the old list[list[str]]: buffer[row][column] = 'x'
+    Writing through the view marks the row as dirty
+    """
+
+    __slots__ = ('buffer', 'row')
+
+    def __init__(self, buffer: 'CellBuffer', row: int) -> None:
+        self.buffer: CellBuffer = buffer
+        self.row: int = row
+
+    def __getitem__(self, column: int | slice) -> str:
+        """ Return the character of a cell (or a string of a slice of cells) """
+
+        if isinstance(column, slice):
+            return decode(self.buffer.codes[self.row][column])
+
+        return cell_text(self.buffer.codes[self.row][column])
+
+    def __setitem__(self, column: int, char: str) -> None:
+        """ Set the character of a cell, a wide character (or cluster) takes the next cell too """
+
+        if len(char) == 1 and ord(char) < 0x300:  # one cell, no combining marks (see unicode_width.char_width)
+            self.buffer.codes[self.row][column] = ord(char)
+            self.buffer.dirty_rows.add(self.row)
+
+            if column < 0:
+                column += self.buffer.columns
+            self.buffer.repair(self.row, column, column + 1)
+            return
+
+        self.buffer.write(self.row, column % self.buffer.columns, char, self.buffer.styles[self.row][column])
+
+    def __len__(self) -> int:
+        return self.buffer.columns
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.buffer.row_text(self.row))
+
+    def __str__(self) -> str:
+        return self.buffer.row_text(self.row)
+
+
+class CellBuffer:
+    """
+    Compact storage for a rectangle of terminal cells
+    Every row is a pair of mutable arrays - one with code points and one with style ids (0 is the default style)
+    Compared to list[list[str]] this uses 6 bytes per cell and allows whole row slices to be copied at once
+    A wide character takes two cells - its code and a continuation (see unicode_width), clusters of several
+    code points are stored as references to interned clusters
+    Keeps track of the rows written to since the last time dirty_rows was cleared
+    """
+
+    __slots__ = ('rows', 'columns', 'codes', 'styles', 'dirty_rows')
+
+    def __init__(self, rows: int, columns: int) -> None:
+        self.rows: int = rows
+        self.columns: int = columns
+
+        self.codes: list[array] = [array(CODE_TYPE, [BLANK]) * columns for row in range(rows)]
+        self.styles: list[array] = [array('H', [0]) * columns for row in range(rows)]
+
+        # every row is new, so every row is dirty
+        self.dirty_rows: set[int] = set(range(rows))
+
+    def __getitem__(self, row: int) -> CellRow:
+        """ Return a view of a row, negative indexes count from the bottom """
+
+        if row < 0:
+            row += self.rows
+
+        if not 0 <= row < self.rows:
+            raise IndexError("Row out of range")
+
+        return CellRow(self, row)
+
+    def __iter__(self) -> Iterator[CellRow]:
+        return (CellRow(self, row) for row in range(self.rows))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __str__(self) -> str:
+        return '\n'.join([self.row_text(row) for row in range(self.rows)])
+
+    def row_text(self, row: int, start: int = 0, end: int = None) -> str:
+        """ Return the characters of a row (or a part of it) as a string """
+
+        return decode(self.codes[row][start:end])
+
+    def write(self, row: int, column: int, text: str, style: 'int | Style' = 0) -> None:
+        """
+        Write a string into a row starting from column, text which doesn't fit is cut off
+        Every character takes as many cells as it's wide
+        """
+
+        cells: array = text_cells(text)[:self.columns - column]
+        end: int = column + len(cells)
+
+        self.codes[row][column:end] = cells
+        self.styles[row][column:end] = array('H', [style]) * len(cells)
+        self.dirty_rows.add(row)
+        self.repair(row, column, end)
+
+    def repair(self, row: int, start: int, end: int) -> None:
+        """
+        Fix wide characters broken by writing cells start to end of a row
+        A wide character which lost one of its halves is replaced with a blank
+        """
+
+        if start >= end:
+            return
+
+        codes: array = self.codes[row]
+
+        if codes[start] == CONTINUATION:
+            codes[start] = BLANK  # its left half is outside
+        elif start > 0 and codes[start - 1] >= FIRST_WIDE and cell_width(codes[start - 1]) == 2:
+            codes[start - 1] = BLANK  # its right half was overwritten
+
+        if end < self.columns and codes[end] == CONTINUATION and not (codes[end - 1] >= FIRST_WIDE and cell_width(codes[end - 1]) == 2):
+            codes[end] = BLANK  # its left half was overwritten
+        elif codes[end - 1] >= FIRST_WIDE and cell_width(codes[end - 1]) == 2 and (end == self.columns or codes[end] != CONTINUATION):
+            codes[end - 1] = BLANK  # its right half is outside
+
+    def clear(self) -> None:
+        """ Fill the whole buffer with blank cells, reusing the existing rows """
+
+        blank_codes: array = array(CODE_TYPE, [BLANK]) * self.columns
+        blank_styles: array = array('H', [0]) * self.columns
+
+        for row in range(self.rows):
+            self.codes[row][:] = blank_codes
+            self.styles[row][:] = blank_styles
+
+        self.dirty_rows.update(range(self.rows))
+
+    def resize(self, rows: int, columns: int) -> bool:
+        """
+        Resize the buffer, clearing it
+        Nothing is done (and content is kept) if the size is unchanged
+        Returns whether the buffer was resized
+        """
+
+        if rows == self.rows and columns == self.columns:
+            return False
+
+        # drop rows that no longer fit and add missing ones, existing rows are resized in place by clear
+        del self.codes[rows:]
+        del self.styles[rows:]
+        self.codes.extend(array(CODE_TYPE) for row in range(rows - self.rows))
+        self.styles.extend(array('H') for row in range(rows - self.rows))
+
+        self.rows = rows
+        self.columns = columns
+        self.dirty_rows = {row for row in self.dirty_rows if row < rows}
+        self.clear()
+
+        return True
+
+    def scroll(self, lines: int, top: int = 0, bottom: int = None) -> None:
+        """
+        Scroll rows top to bottom (exclusive) up by lines (down if negative)
+        Rows are moved by reference, no cells are copied - only the rows exposed at the bottom (top) are cleared
+        Dirty rows move with their content, exposed rows become dirty
+        """
+
+        bottom = self.rows if bottom is None else bottom
+        height: int = bottom - top
+
+        if lines == 0 or height <= 0:
+            return
+
+        if abs(lines) >= height:
+            exposed: range = range(top, bottom)
+        else:
+            shift: int = lines % height
+            self.codes[top:bottom] = self.codes[top + shift:bottom] + self.codes[top:top + shift]
+            self.styles[top:bottom] = self.styles[top + shift:bottom] + self.styles[top:top + shift]
+
+            exposed = range(bottom - lines, bottom) if lines > 0 else range(top, top - lines)
+
+            # rows which are still visible keep their dirty state
+            self.dirty_rows = {
+                row - lines if top <= row < bottom else row for row in self.dirty_rows
+                if not top <= row < bottom or top <= row - lines < bottom
+            }
+
+        blank_codes: array = array(CODE_TYPE, [BLANK]) * self.columns
+        blank_styles: array = array('H', [0]) * self.columns
+
+        for row in exposed:
+            self.codes[row][:] = blank_codes
+            self.styles[row][:] = blank_styles
+
+        self.dirty_rows.update(exposed)
+
+    def blit(self, source: 'CellBuffer', row_offset: int, column_offset: int, rows: set[int] = None) -> None:
+        """
+        Copy rows of source (all by default) into this buffer, placing its top left cell at (row_offset, column_offset)
+        Each row is copied as a whole slice, parts outside of this buffer are cut off
+        """
+
+        # columns of source that land inside this buffer
+        start: int = max(0, -column_offset)
+        end: int = min(source.columns, self.columns - column_offset)
+
+        if start >= end:
+            return
+
+        if rows is None:
+            rows = range(source.rows)
+
+        for row in rows:
+            target_row: int = row + row_offset
+
+            if not 0 <= target_row < self.rows:
+                continue
+
+            self.codes[target_row][start + column_offset:end + column_offset] = source.codes[row][start:end]
+            self.styles[target_row][start + column_offset:end + column_offset] = source.styles[row][start:end]
+            self.dirty_rows.add(target_row)
+            self.repair(target_row, start + column_offset, end + column_offset)
+
+    def copy_span(self, source: 'CellBuffer', source_row: int, row: int, start: int, end: int, column_offset: int) -> None:
+        """ Copy columns start to end (exclusive) of a row of source into row of this buffer, shifted by column_offset """
+
+        self.codes[row][start + column_offset:end + column_offset] = source.codes[source_row][start:end]
+        self.styles[row][start + column_offset:end + column_offset] = source.styles[source_row][start:end]
+        self.dirty_rows.add(row)
+        self.repair(row, start + column_offset, end + column_offset)
+
+    def clear_span(self, row: int, start: int, end: int) -> None:
+        """ Fill columns start to end (exclusive) of a row with blank cells """
+
+        self.codes[row][start:end] = array(CODE_TYPE, [BLANK]) * (end - start)
+        self.styles[row][start:end] = array('H', [0]) * (end - start)
+        self.dirty_rows.add(row)
+        self.repair(row, start, end)
+
+    def copy(self) -> 'CellBuffer':
+        """ Return a copy of the buffer """
+
+        buffer: CellBuffer = CellBuffer(0, self.columns)
+        buffer.rows = self.rows
+        buffer.codes = [array(CODE_TYPE, row) for row in self.codes]
+        buffer.styles = [array('H', row) for row in self.styles]
+        buffer.dirty_rows = set(self.dirty_rows)
+
+        return buffer
+
+    def crop(self, top: int, left: int, rows: int, columns: int) -> 'CellBuffer':
+        """ Return a copy of a rectangle of the buffer """
+
+        buffer: CellBuffer = CellBuffer(0, columns)
+        buffer.rows = rows
+        buffer.codes = [self.codes[row][left:left + columns] for row in range(top, top + rows)]
+        buffer.styles = [self.styles[row][left:left + columns] for row in range(top, top + rows)]
+        buffer.dirty_rows = set()
+
+        return buffer
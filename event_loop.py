@@ -0,0 +1,305 @@
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable
+
+from callbacks import invoke
+from frame_manager import FrameManager
+from input import Input
+from terminal import TerminalBackend
+
+
+class Timer:
+    """ Handle of a timer created by EventLoop.call_later/call_every, allows cancelling it """
+
+    def __init__(self, loop: 'EventLoop', callback: Callable[..., Any], args: tuple, interval: float = None) -> None:
+        self.loop: EventLoop = loop
+        self.callback: Callable[..., Any] = callback
+        self.args: tuple = args
+        self.interval: float = interval  # None for one shot timers
+        self.handle: asyncio.TimerHandle = None
+        self.delay: float = None  # delay of a timer created before the loop runs
+
+    def schedule(self, delay: float) -> None:
+        if self.loop.loop is None:
+            self.delay = delay  # scheduled by run, the delay counts from then
+            return
+
+        self.handle = self.loop.loop.call_later(delay, self._fire)
+
+    def _fire(self) -> None:
+        if self.interval is not None:
+            self.schedule(self.interval)
+        else:
+            self.loop.timers.discard(self)
+
+        invoke(self.callback, *self.args)
+        self.loop.request_render()
+
+    def cancel(self) -> None:
+        """ Stop the timer, it won't fire (again) """
+
+        if self.handle is not None:
+            self.handle.cancel()
+
+        self.loop.timers.discard(self)
+
+
+class EventLoop:
+    """
+    Main loop of the program, built on asyncio
+    - stdin is read through loop.add_reader, events are dispatched as they come
+    - SIGWINCH arrives through the terminal's self-pipe, resizes are debounced by the terminal
+    - rendering happens in render ticks, at most one per frame interval and only when requested
+      (any input, resize or timer requests one), a partially written frame is resumed when the terminal is writable
+    - timers with call_later and call_every
+
+    Subscribers of Mouse.subscribe, Keyboard.subscribe and Terminal.on_resize (and timers) may be coroutine functions
+    Their coroutines run as tasks, so a slow handler or a background load doesn't block input or repainting
+
+    start paints the first frame before asyncio is imported (which takes longer than everything else at startup)
+    """
+
+    def __init__(self, frame_manager: FrameManager, input_: Input = None) -> None:
+        self.frame_manager: FrameManager = frame_manager
+        self.terminal: TerminalBackend = frame_manager.terminal
+        self.input: Input = Input() if input_ is None else input_
+
+        self.loop: asyncio.AbstractEventLoop = None
+        self.timers: set[Timer] = set()
+
+        # calls from other threads made before the loop runs (see call_threadsafe)
+        self._early_calls: list[tuple[Callable[..., Any], tuple]] = []
+        self._early_lock: Lock = Lock()
+
+        self._stopped: asyncio.Future = None
+        self._render_handle: asyncio.TimerHandle = None
+        self._input_handle: asyncio.TimerHandle = None
+        self._resize_handle: asyncio.TimerHandle = None
+        self._writing: bool = False  # waiting for the terminal to take the rest of a frame
+
+    def start(self) -> None:
+        """ Show the first frame and run the loop until stop is called (blocking) """
+
+        with self.input:
+            self.frame_manager.print(force=True)
+
+            import asyncio
+            asyncio.run(self.run())
+
+    async def run(self) -> None:
+        """ Run the loop until stop is called """
+
+        import asyncio
+
+        with self._early_lock:
+            self.loop = asyncio.get_running_loop()
+
+        self._stopped = self.loop.create_future()
+
+        for callback, args in self._early_calls:
+            self.loop.call_soon(self._call, callback, args)
+        self._early_calls.clear()
+
+        for timer in list(self.timers):
+            if timer.handle is None:
+                timer.schedule(timer.delay)
+
+        self.input.start_listen()  # nothing happens if start already did
+        self.loop.add_reader(self.input.fileno(), self._on_input)
+        self.loop.add_reader(self.terminal.fileno(), self._on_resize_signal)
+
+        try:
+            self.request_render()
+            await self._stopped
+        finally:
+            self.loop.remove_reader(self.input.fileno())
+            self.loop.remove_reader(self.terminal.fileno())
+
+            if self._writing:
+                self.loop.remove_writer(self.terminal.fd)
+
+            for timer in list(self.timers):
+                timer.cancel()
+
+            self.input.stop_listen()
+            self.terminal.flush(block=True)
+
+    def stop(self) -> None:
+        """ Stop the loop (after the current callback) """
+
+        if self._stopped is not None and not self._stopped.done():
+            self._stopped.set_result(None)
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """ Call callback with args once after delay seconds """
+
+        timer: Timer = Timer(self, callback, args)
+        self.timers.add(timer)
+        timer.schedule(delay)
+
+        return timer
+
+    def call_every(self, interval: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """ Call callback with args every interval seconds until the timer is cancelled """
+
+        timer: Timer = Timer(self, callback, args, interval)
+        self.timers.add(timer)
+        timer.schedule(interval)
+
+        return timer
+
+    def call_threadsafe(self, callback: Callable[..., Any], *args: Any) -> None:
+        """
+        Call callback with args on the loop's thread as soon as possible, can be called from any thread
+        Calls made before the loop runs are made once it does
+        """
+
+        with self._early_lock:
+            if self.loop is None:
+                self._early_calls.append((callback, args))
+                return
+
+        self.loop.call_soon_threadsafe(self._call, callback, args)
+
+    def _call(self, callback: Callable[..., Any], args: tuple) -> None:
+        invoke(callback, *args)
+        self.request_render()
+
+    def request_render(self) -> None:
+        """ Schedule a render tick, respecting the frame rate cap. Requests before the tick are merged """
+
+        if self._render_handle is not None or self._writing or self.loop is None:
+            return
+
+        delay: float = max(0, self.terminal.last_frame + self.terminal.frame_interval - monotonic())
+        self._render_handle = self.loop.call_later(delay, self._render)
+
+    def _render(self) -> None:
+        """ Render tick """
+
+        self._render_handle = None
+
+        if not self.frame_manager.print():
+            # frame rate cap or the terminal is still busy - the changes wait in char_grid
+            if self.terminal.pending:
+                self._wait_writable()
+            else:
+                self.request_render()
+            return
+
+        if self.terminal.pending:
+            self._wait_writable()
+
+    def _wait_writable(self) -> None:
+        """ Resume writing the current frame once the terminal is writable """
+
+        if not self._writing:
+            self._writing = True
+            self.loop.add_writer(self.terminal.fd, self._on_writable)
+
+    def _on_writable(self) -> None:
+        if self.terminal.flush():
+            self._writing = False
+            self.loop.remove_writer(self.terminal.fd)
+            self.request_render()  # changes made while writing were coalesced, show them
+
+    def _on_input(self) -> None:
+        """ stdin is readable """
+
+        self.input.read_input()
+
+        if self.input.eof:
+            # stdin is gone (hangup, closed pipe) - it stays readable forever, so the loop would spin
+            self.loop.remove_reader(self.input.fileno())
+            self.stop()
+            return
+
+        self._schedule_input_tick()
+        self.request_render()
+
+    def _schedule_input_tick(self) -> None:
+        """ Make sure events held back by the input (coalesced motion) are dispatched in time """
+
+        if self._input_handle is not None:
+            self._input_handle.cancel()
+            self._input_handle = None
+
+        timeout: float = self.input.timeout()
+        if timeout is not None:
+            self._input_handle = self.loop.call_later(timeout, self._input_tick)
+
+    def _input_tick(self) -> None:
+        self._input_handle = None
+        self.input.tick()
+        self._schedule_input_tick()
+        self.request_render()
+
+    def _on_resize_signal(self) -> None:
+        """ SIGWINCH arrived - (re)start the debounce and check again when it ends """
+
+        self.terminal.handle_resize_signal()
+
+        if self._resize_handle is not None:
+            self._resize_handle.cancel()
+
+        self._resize_handle = self.loop.call_later(self.terminal.timeout(), self._resize_tick)
+
+    def _resize_tick(self) -> None:
+        self._resize_handle = None
+        self.terminal.update()  # frame manager relayouts and repaints through its resize listener
+
+        if self.terminal.pending:
+            self._wait_writable()  # the repaint didn't fit into the terminal at once
+
+
+if __name__ == '__main__':
+    import asyncio
+    from input import MouseEvent
+
+    frame_manager: FrameManager = FrameManager()
+    frame_manager.frames[-1].add_border()
+    for i in range(2):
+        frame_manager.splitv(frame_manager.frames[-1]).add_border()
+        frame_manager.splith(frame_manager.frames[-1]).add_border()
+
+    event_loop: EventLoop = EventLoop(frame_manager)
+    frame_manager.attach_mouse(event_loop.input.mouse)
+
+    for frame in frame_manager.frames:
+        # mark the clicked cell of the frame
+        def clicked(event: MouseEvent, row: int, column: int, frame=frame) -> None:
+            if event == MouseEvent.LEFT_CLICK_HOLD:
+                frame.set_char(row, column, 'x')
+
+        frame.on_mouse(clicked)
+
+    # a slow coroutine handler doesn't block input or rendering
+    async def slow_clear() -> None:
+        await asyncio.sleep(1)
+        for frame in frame_manager.frames:
+            frame.chars.clear()
+            frame.add_border()
+        event_loop.request_render()
+
+    event_loop.input.keyboard.subscribe('c', slow_clear)
+    event_loop.input.keyboard.subscribe('q', event_loop.stop)
+
+    # 'p' shows the timings of the main loop stages in an overlay
+    from profiler import profiler
+    from profiler_overlay import show_overlay
+
+    def toggle_profiler() -> None:
+        if profiler.enabled:
+            profiler.disable()
+            frame_manager.close_overlay(profiler_widget.pop().frame)
+            refresh.pop().cancel()
+        else:
+            profiler.enable()
+            profiler_widget.append(show_overlay(frame_manager))
+            refresh.append(event_loop.call_every(0.5, profiler_widget[0].refresh))
+
+    profiler_widget: list = []
+    refresh: list = []
+    event_loop.input.keyboard.subscribe('p', toggle_profiler)
+
+    event_loop.start()
@@ -0,0 +1,381 @@
+from typing import Any, Callable, Iterator
+
+from callbacks import invoke
+
+
+# columns loaded for every block, in the order Block expects them
+COLUMNS: str = "id, parent_id, root_id, type, title, fields, create_at, update_at, delete_at"
+
+# queries are constants, so sqlite3 reuses their prepared statements
+BOARDS_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE type = 'board' AND delete_at = 0 ORDER BY title"
+BLOCK_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE id = ?"
+CHILDREN_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE parent_id = ? AND type = ? AND delete_at = 0 ORDER BY create_at, id"
+CONTENT_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE parent_id = ? AND type NOT IN ('card', 'view') AND delete_at = 0 ORDER BY create_at, id"
+CARDS_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE parent_id = ? AND type = 'card' AND delete_at = 0 AND (create_at, id) > (?, ?) ORDER BY create_at, id LIMIT ?"
+CARD_PAGE_QUERY: str = f"SELECT {COLUMNS} FROM blocks WHERE parent_id = ? AND type = 'card' AND delete_at = 0 ORDER BY create_at, id LIMIT ? OFFSET ?"
+CARD_COUNT_QUERY: str = "SELECT count(*) FROM blocks WHERE parent_id = ? AND type = 'card' AND delete_at = 0"
+
+# change feed - blocks_history is append only, its rowids are a cursor that needs no index
+# the cursor row's primary key (id, insert_at) tells if the rowids were renumbered (VACUUM) since
+DATA_VERSION_QUERY: str = "PRAGMA data_version"
+LAST_HISTORY_QUERY: str = "SELECT rowid, id, insert_at FROM blocks_history ORDER BY rowid DESC LIMIT 1"
+HISTORY_KEY_QUERY: str = "SELECT id, insert_at FROM blocks_history WHERE rowid = ?"
+HISTORY_ROWID_QUERY: str = "SELECT rowid FROM blocks_history WHERE id = ? AND insert_at = ?"
+HISTORY_BEFORE_QUERY: str = "SELECT coalesce(max(rowid), 0) FROM blocks_history WHERE insert_at <= ?"
+CHANGED_QUERY: str = f"SELECT rowid, insert_at, {COLUMNS} FROM blocks_history WHERE rowid IN (SELECT max(rowid) FROM blocks_history WHERE rowid > ? GROUP BY id) ORDER BY rowid"
+
+# indexes which speed up the queries above, only created by ensure_indexes
+# (parent_id, type, create_at, id) also serves card paging
+INDEXES: tuple[str, ...] = (
+    "CREATE INDEX IF NOT EXISTS pttui_blocks_parent_id ON blocks (parent_id, type, create_at, id)",
+    "CREATE INDEX IF NOT EXISTS pttui_blocks_root_id ON blocks (root_id)",
+    "CREATE INDEX IF NOT EXISTS pttui_blocks_type ON blocks (type)",
+)
+
+
+class Block:
+    """
+    A row of the blocks table - a board, view, card or a content block of a card (text, divider, ...)
+    fields is JSON in the database and is only parsed when first used
+    """
+
+    __slots__ = ('id', 'parent_id', 'root_id', 'type', 'title', 'create_at', 'update_at', 'delete_at', '_raw_fields', '_fields')
+
+    def __init__(self, row: tuple) -> None:
+        self.update(row)
+
+    def update(self, row: tuple) -> None:
+        """ Load the values of a row (in COLUMNS order) """
+
+        (self.id, self.parent_id, self.root_id, self.type, self.title, self._raw_fields,
+         self.create_at, self.update_at, self.delete_at) = row
+        self._fields: dict[str, Any] = None
+
+    @property
+    def fields(self) -> dict[str, Any]:
+        """ The parsed fields JSON """
+
+        if self._fields is None:
+            import json  # only needed once fields are looked at
+            self._fields = json.loads(self._raw_fields) if self._raw_fields else {}
+
+        return self._fields
+
+    def __repr__(self) -> str:
+        return f"Block({self.type}, {self.title!r})"
+
+
+class Board:
+    """
+    A board and the part of its tree loaded so far
+    Views are loaded on first use, cards page by page with load_cards
+    """
+
+    def __init__(self, database: 'Database', block: Block) -> None:
+        self.database: Database = database
+        self.block: Block = block
+
+        self._views: list[Block] = None
+        self.cards: list[Block] = []  # cards loaded so far, in creation order
+        self.all_cards_loaded: bool = False
+
+    @property
+    def views(self) -> list[Block]:
+        if self._views is None:
+            self._views = self.database.children(self.block.id, 'view')
+
+        return self._views
+
+    def load_cards(self, count: int = 100) -> list[Block]:
+        """ Load the next page of cards, returns the new cards (empty once all are loaded) """
+
+        if self.all_cards_loaded:
+            return []
+
+        page: list[Block] = self.database.cards(self.block.id, self.cards[-1] if self.cards else None, count)
+        self.cards.extend(page)
+
+        if len(page) < count:
+            self.all_cards_loaded = True
+
+        return page
+
+    def card_count(self) -> int:
+        """ Amount of cards in the board (a count query, doesn't load them) """
+
+        return self.database.card_count(self.block.id)
+
+
+def ensure_indexes(path: str = 'focalboard.db') -> bool:
+    """
+    Create the indexes which speed up Database's queries (INDEXES), if they don't exist yet
+    This writes to the database of the Focalboard server, so it's never done implicitly - Database works without them
+    Returns whether the indexes exist now
+    """
+
+    import sqlite3
+
+    try:
+        connection: sqlite3.Connection = sqlite3.connect(f"file:{path}?mode=rw", uri=True)
+    except sqlite3.OperationalError:
+        return False
+
+    try:
+        with connection:
+            for index in INDEXES:
+                connection.execute(index)
+    except sqlite3.OperationalError:
+        return False  # read-only file or locked by the server
+    finally:
+        connection.close()
+
+    return True
+
+
+class Database:
+    """
+    Read-only access to a Focalboard SQLite database
+    Nothing is loaded up front - boards, views, cards and card content are queried when asked for
+    Loaded blocks are kept in an identity map (blocks), the same id always gives the same Block object
+    """
+
+    def __init__(self, path: str = 'focalboard.db') -> None:
+        import sqlite3  # imported with the first database, not with the module
+
+        self.path: str = path
+        self.connection: sqlite3.Connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+        self.blocks: dict[str, Block] = {}
+        self.loaded_boards: dict[str, Board] = {}  # boards handed out, kept up to date by apply/remove
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _blocks(self, rows: Iterator[tuple]) -> list[Block]:
+        """ Turn rows into blocks, reusing (and updating) blocks already loaded """
+
+        result: list[Block] = []
+
+        for row in rows:
+            block: Block = self.blocks.get(row[0])
+
+            if block is None:
+                block = self.blocks[row[0]] = Block(row)
+            elif block.update_at != row[7]:
+                block.update(row)
+
+            result.append(block)
+
+        return result
+
+    def boards(self) -> list[Board]:
+        """ All boards (not deleted) - their views and cards aren't loaded yet """
+
+        boards: list[Board] = []
+
+        for block in self._blocks(self.connection.execute(BOARDS_QUERY)):
+            if block.id not in self.loaded_boards:
+                self.loaded_boards[block.id] = Board(self, block)
+            boards.append(self.loaded_boards[block.id])
+
+        return boards
+
+    def block(self, block_id: str) -> Block:
+        """ A single block by id, None if it doesn't exist """
+
+        if block_id in self.blocks:
+            return self.blocks[block_id]
+
+        blocks: list[Block] = self._blocks(self.connection.execute(BLOCK_QUERY, (block_id,)))
+
+        return blocks[0] if blocks else None
+
+    def children(self, parent_id: str, type_: str) -> list[Block]:
+        """ Children of a block of one type, for example the views of a board """
+
+        return self._blocks(self.connection.execute(CHILDREN_QUERY, (parent_id, type_)))
+
+    def content(self, card_id: str) -> list[Block]:
+        """ Content blocks of a card (text, checkbox, divider, comment, ...) """
+
+        return self._blocks(self.connection.execute(CONTENT_QUERY, (card_id,)))
+
+    def cards(self, board_id: str, after: Block = None, count: int = 100) -> list[Block]:
+        """
+        A page of cards of a board, in creation order, starting after the card after
+        Uses keyset paging, so a page costs the same no matter how deep into the board it is
+        """
+
+        position: tuple[int, str] = (after.create_at, after.id) if after is not None else (-1, '')
+
+        return self._blocks(self.connection.execute(CARDS_QUERY, (board_id, *position, count)))
+
+    def card_page(self, board_id: str, start: int, count: int = 100) -> list[Block]:
+        """
+        count cards of a board starting from the card at index start, in creation order
+        Random access for lists which jump around, cards gets deep pages cheaper
+        """
+
+        return self._blocks(self.connection.execute(CARD_PAGE_QUERY, (board_id, count, start)))
+
+    def card_count(self, board_id: str) -> int:
+        return self.connection.execute(CARD_COUNT_QUERY, (board_id,)).fetchone()[0]
+
+    def apply(self, row: tuple) -> Block:
+        """
+        Apply a changed row to the loaded model, returns its block
+        Loaded blocks are updated in place, new cards are added to their board if it's fully loaded
+        (otherwise they come with a later page - new cards sort last)
+        """
+
+        if row[8]:  # delete_at, deleted through the UI
+            self.remove(row[0])
+            return None
+
+        new: bool = row[0] not in self.blocks
+        block: Block = self._blocks([row])[0]
+        board: Board = self.loaded_boards.get(block.parent_id)
+
+        if board is not None:
+            if block.type == 'card' and new and board.all_cards_loaded:
+                board.cards.append(block)
+            elif block.type == 'view' and board._views is not None and block not in board._views:
+                board._views.append(block)
+
+        return block
+
+    def remove(self, block_id: str) -> Block:
+        """ Remove a deleted block from the loaded model, returns it (None if it wasn't loaded) """
+
+        block: Block = self.blocks.pop(block_id, None)
+
+        if block is not None:
+            board: Board = self.loaded_boards.get(block.parent_id)
+
+            if board is not None:
+                if block in board.cards:
+                    board.cards.remove(block)
+                if board._views is not None and block in board._views:
+                    board._views.remove(block)
+
+            self.loaded_boards.pop(block_id, None)
+
+        return block
+
+
+class Watcher:
+    """
+    Change feed of a Focalboard database, for showing edits made by the server while the program runs
+    poll fetches only what changed since the last poll:
+    - PRAGMA data_version tells if anything was committed at all (nothing is read from the tables otherwise)
+    - the server adds a row to blocks_history for every insert, update and delete - the rows after the last
+      one seen give the changed blocks (their latest row, deleted ones have delete_at set)
+    Rows are found by rowid, so polling needs no index of its own
+    Changes are applied to the database's loaded model as deltas, and only the watchers of changed blocks
+    (usually frames or widgets, anything with mark_dirty) are marked dirty
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database: Database = database
+        connection: sqlite3.Connection = database.connection
+
+        self.data_version: int = connection.execute(DATA_VERSION_QUERY).fetchone()[0]
+
+        # rowid and (id, insert_at) of the last history row seen
+        last: tuple = connection.execute(LAST_HISTORY_QUERY).fetchone()
+        self.last_history: int = last[0] if last else 0
+        self.last_key: tuple[str, str] = last[1:] if last else None
+
+        # block id -> things showing it, marked dirty when the block or one of its children changes
+        self.watchers: dict[str, set[Any]] = {}
+        # called with (changed blocks, deleted block ids) after every poll with changes
+        self.listeners: set[Callable[[list[Block], list[str]], Any]] = set()
+
+    def watch(self, block_id: str, target: Any) -> None:
+        """ Mark target dirty (target.mark_dirty()) when the block or its direct children change """
+
+        self.watchers.setdefault(block_id, set()).add(target)
+
+    def unwatch(self, block_id: str, target: Any) -> None:
+        targets: set[Any] = self.watchers.get(block_id)
+
+        if targets is not None:
+            targets.discard(target)
+            if not targets:
+                del self.watchers[block_id]
+
+    def on_change(self, callback: Callable[[list[Block], list[str]], Any]) -> None:
+        """ Subscribe to changes, callback is called with the changed blocks and the deleted block ids """
+
+        self.listeners.add(callback)
+
+    def _resync(self) -> None:
+        """
+        Find the cursor row again if the rowids of blocks_history were renumbered (VACUUM)
+        It's looked up by its primary key, if it's gone the cursor moves to the last row inserted before it
+        """
+
+        if self.last_key is None:
+            return
+
+        connection: sqlite3.Connection = self.database.connection
+
+        row: tuple = connection.execute(HISTORY_KEY_QUERY, (self.last_history,)).fetchone()
+        if row == self.last_key:
+            return  # still in place, the usual case
+
+        row = connection.execute(HISTORY_ROWID_QUERY, self.last_key).fetchone()
+        self.last_history = row[0] if row else connection.execute(HISTORY_BEFORE_QUERY, (self.last_key[1],)).fetchone()[0]
+
+    def poll(self) -> bool:
+        """ Fetch and apply changes since the last poll, returns whether there were any """
+
+        connection: sqlite3.Connection = self.database.connection
+
+        data_version: int = connection.execute(DATA_VERSION_QUERY).fetchone()[0]
+        if data_version == self.data_version:
+            return False  # nothing was committed since the last poll
+
+        self.data_version = data_version
+        self._resync()
+
+        changed: list[Block] = []
+        deleted: list[str] = []
+        affected: set[str] = set()
+
+        for rowid, insert_at, *row in connection.execute(CHANGED_QUERY, (self.last_history,)):
+            if rowid > self.last_history:
+                self.last_history, self.last_key = rowid, (row[0], insert_at)
+            affected.update((row[0], row[1]))
+
+            block: Block = self.database.apply(row)
+            if block is None:
+                deleted.append(row[0])
+            else:
+                changed.append(block)
+
+        for block_id in affected:
+            for target in self.watchers.get(block_id, ()):
+                target.mark_dirty()
+
+        if changed or deleted:
+            for callback in self.listeners:
+                invoke(callback, changed, deleted)
+
+        return bool(changed or deleted)
+
+
+if __name__ == '__main__':
+    database: Database = Database()
+
+    for board in database.boards():
+        print(board.block.title, board.block.fields.get('icon', ''), f"{board.card_count()} cards")
+
+        for view in board.views:
+            print('  view:', view.title)
+
+        while board.load_cards(5):
+            pass
+
+        for card in board.cards:
+            print('  card:', card.title)
@@ -1,3 +1,15 @@
+from operator import index
+from typing import Any, Callable
+
+from cell_buffer import CellBuffer
+from render_cache import render_cache
+from style import Style
+
+
+# code point of the sides of a border
+SIDE: int = ord('║')
+
+
 class Frame():
 
     """
@@ -15,71 +27,157 @@ class Frame():
 
         self.top_left_point: tuple[int] = top_left_point 
 
-        # matrix holding how the frame should look in the terminal
-        self.chars: list[list[str]] = [ [' ' for column in range(columns)] for row in range(rows)] 
+        # cells holding how the frame should look in the terminal (used as chars[row][column])
+        self.chars: CellBuffer = CellBuffer(rows, columns)
 
         self.has_border: bool = False
+        self.border_style: int = 0
+
+        # called with (event, row, column) for mouse events over the frame, coordinates relative to the frame
+        self.mouse_listeners: set[Callable[..., Any]] = set()
+
+        # widget drawn in the frame (see Widget.attach)
+        self.widget: 'Widget' = None
+
+        # scrolls since the frame manager last copied the frame - (top, bottom, lines)
+        # lets the frame manager scroll the terminal instead of repainting the rows
+        self.scrolls: list[tuple[int, int, int]] = []
+
+    def on_mouse(self, callback: Callable[..., Any]) -> None:
+        """ Subscribe a function to mouse events happening over the frame (see FrameManager.dispatch_mouse) """
+
+        self.mouse_listeners.add(callback)
+
+    @property
+    def dirty_rows(self) -> set[int]:
+        """ Rows changed since the frame manager last copied this frame """
+
+        return self.chars.dirty_rows
+
+    def mark_dirty(self, row: int = None) -> None:
+        """
+        Mark a row (or the whole frame if row is None) as changed
+        Call after writing to 'self.chars' directly, so the frame manager repaints it
+        """
+
+        if row is None:
+            self.dirty_rows.update(range(self.rows))
+        else:
+            self.dirty_rows.add(row)
+
+    def set_char(self, row: int, column: int, char: str, style: int | Style = None) -> None:
+        """ Set a single character (and its style id, see style.style) and mark its row as dirty """
+
+        if style is None:
+            self.chars[row][column] = char  # keeps the style of the cell
+            return
+
+        # every cell the character takes gets the style, a wide one takes two
+        self.chars.write(range(self.rows)[row], range(self.columns)[column], char, style)  # negative indexes as for chars[row][column]
+
+    def content_area(self) -> tuple[int, int, int, int]:
+        """ Return the part of the frame a widget can draw in - (top, left, rows, columns), inside the border if there is one """
+
+        if self.has_border:
+            return 1, 1, max(0, self.rows - 2), max(0, self.columns - 2)
+
+        return 0, 0, self.rows, self.columns
 
-    def add_border(self):
+    def scroll(self, lines: int, top: int = 0, bottom: int = None) -> None:
         """
-        add a border to the frame 
+        Scroll rows top to bottom (exclusive) of the frame up by lines (down if negative)
+        The rows are moved without copying, the exposed rows are cleared and marked dirty
+        The side border is kept
+        """
+
+        bottom = self.rows if bottom is None else bottom
+
+        self.chars.scroll(lines, top, bottom)
+        self.scrolls.append((top, bottom, lines))
+
+        if self.has_border and self.columns:
+            exposed: range = range(max(top, bottom - lines), bottom) if lines > 0 else range(top, min(bottom, top - lines))
+            for row in exposed:
+                if 0 <= row < self.rows:
+                    self.chars.codes[row][0] = self.chars.codes[row][-1] = SIDE
+                    self.chars.styles[row][0] = self.chars.styles[row][-1] = self.border_style
+
+    def add_border(self, style: int | Style = None) -> None:
+        """
+        add a border to the frame (in the style used last time by default)
         useful for debug visualization  
-        OPT: use list comprehension for better performance? tradeoff readability
+        The top and bottom rows come from the render cache (as whole rows), the sides are set per row
         """
 
-        for row_count, row in enumerate(self.chars):
-            for column_count, char in enumerate(row):
-                if column_count == 0 or column_count == self.columns - 1:
-                    self.chars[row_count][column_count] = "║"
+        style = self.border_style if style is None else index(style)  # ids only, they are part of cache keys
 
-                if row_count == 0 or row_count == self.rows - 1:
-                    self.chars[row_count][column_count] = "═"
+        self.border_style = style
 
-        # fix corner pieces
-        self.chars[0][0] = '╔'
-        self.chars[0][-1] = '╗'
-        self.chars[-1][-1] = '╝'
-        self.chars[-1][0] = '╚'
+        # nothing to draw on (frame shrunk to nothing on resize)
+        if self.rows == 0 or self.columns == 0:
+            self.has_border = True
+            return
+
+        edges: CellBuffer = self._border_edges(self.columns, style)
+
+        for row in range(1, self.rows - 1):
+            self.chars.codes[row][0] = self.chars.codes[row][-1] = SIDE
+            self.chars.styles[row][0] = self.chars.styles[row][-1] = style
+
+        # bottom row last, so it wins in a frame one row high (as before)
+        self.chars.blit(edges, 0, 0, {0})
+        self.chars.blit(edges, self.rows - 2, 0, {1})
 
         # update has_border
         self.has_border = True
+        self.mark_dirty()
+
+    @staticmethod
+    def _border_edges(columns: int, style: int) -> CellBuffer:
+        """ Top and bottom row of a border of a frame with columns, cached """
+
+        key: tuple = ('border', columns, style)
+        edges: CellBuffer = render_cache.get(key)
+
+        if edges is None:
+            edges = CellBuffer(2, columns)
+            edges.write(0, 0, ('╔' + '═' * (columns - 2) + '╗')[-columns:], style)
+            edges.write(1, 0, ('╚' + '═' * (columns - 2) + '╝')[-columns:], style)
+            render_cache.put(key, edges)
+
+        return edges
 
     def resize(self, rows: int, columns: int, top_left_point: tuple[int]) -> None:
         """
         Completely resize/move frame
         Use on terminal resize. Frame manager should subscribe this function to the term event
         And should use it in a way that frames don't overlap (If it's a tiling manager)
+        If only the position changes the content is kept, otherwise the frame is cleared
         """
 
         self.rows = rows
         self.columns = columns
         self.top_left_point = top_left_point
-        self.chars = [ [' ' for column in range(columns)] for row in range(rows)] 
 
-        # TODO: once widgets are added, redraw widget
+        if not self.chars.resize(rows, columns):
+            # same size, only moved - content is kept but has to be copied to its new place
+            self.mark_dirty()
+            return
+
+        self.scrolls.clear()  # the content is gone anyway
 
         # readd border
         if self.has_border:
             self.add_border()
 
+        # let the widget adjust to its new area, it's redrawn on the next compose
+        if self.widget is not None:
+            self.widget.resize()
+
     def __str__(self) -> str:
         """
         Converts 'self.chars' to a string
         Mainly used for visualization and debug of individual frames
-        TODO: use list comprehension here
         """
 
-        buffer: str =  ""
-
-        for row_count, row in enumerate(self.chars):
-
-            for char in row:
-                buffer += f"{char}"
-
-            if row_count != self.rows - 1:
-                buffer += f"\n"
-
-
-
-        return buffer
-
+        return str(self.chars)
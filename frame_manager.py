@@ -1,8 +1,15 @@
-from math import ceil, floor
+from array import array
 from typing import Type
 
+from callbacks import invoke
+from cell_buffer import BLANK, CellBuffer
 from frame import Frame
-from terminal import Terminal
+from input import Mouse, MouseEvent
+from layout import FrameNode, LayoutNode, SplitNode
+from profiler import profiler
+from style import encode
+from terminal import Terminal, TerminalBackend
+from unicode_width import CONTINUATION
 from widget import Widget
 
 
@@ -10,27 +17,59 @@ class FrameManager():
     """
     Class managing multiple frames, including:
     - tilling window manager like frame creation (splitv and splith)
-    - listening to terminal resize events to update a frame
+    - listening to terminal resize events to update all frames at once
     - combining all frames into a string 
-    TODO: Frame overlay - perhaps use multiple frame managers or separate property for that?
-    Uses a 2 dimensional matrix with the size of the terminal when printing
+    - overlays (popups, dialogs, menus) - frames on top of the tiled ones, ordered by z
+    Uses a cell buffer with the size of the terminal when printing
+    Printing only emits the cells that changed since the last print (see print)
     """
 
-    def __init__(self, terminal: Terminal = Terminal()) -> None:
-        self.terminal: Terminal = terminal
+    # unchanged cells tolerated inside a changed run before it is split in two (a cursor move costs ~8 bytes)
+    RUN_GAP: int = 4
+
+    def __init__(self, terminal: TerminalBackend = None) -> None:
+        # the real terminal by default, see headless.HeadlessTerminal for rendering without one
+        self.terminal: TerminalBackend = Terminal() if terminal is None else terminal
 
         self.frames: list[Frame] = []  # create an empty frame
+        # layout tree deciding the geometry of all frames, nodes maps every frame to its leaf
+        self.layout: LayoutNode = None
+        self.nodes: dict[Frame, FrameNode] = {}
         self._create_first_frame()
 
-        """
-        +1 is added to the columns make space for \n
-        Frankly, the \n won't be seen as it's outside of the terminal, but it wraps the lines
-        """
+        # overlays above the tiled frames, lowest first, and their z values
+        self.overlays: list[Frame] = []
+        self.z: dict[Frame, int] = {}
+
+        # hit test grid - for every screen cell the index+1 (in layers) of the frame on top of it (0 for none)
+        # rebuilt lazily after the layout or the overlays change (None means stale)
+        self.hit_grid: list[array] = None
+
+        # frame -> {frame row: visible (start, end) column spans} for rows partially covered by a higher layer
+        # rows which aren't in there are fully visible, built with the hit grid
+        self.occluded: dict[Frame, dict[int, list[tuple[int, int]]]] = {}
+
+        # a single subscription for all frames
+        self.terminal.on_resize(self._on_resize)
+
+        # back buffer holding all the characters to be printed to the term
+        # its dirty_rows are the screen rows changed since the last print
+        self.char_grid: CellBuffer = CellBuffer(self.terminal.rows, self.terminal.columns)
+
+        # front buffer - what is currently on screen (None forces a full repaint)
+        self.front_grid: CellBuffer = None
+
+        # terminal scrolls (DECSTBM + SU/SD) already applied to both buffers, emitted before the next diff
+        self.pending_output: list[str] = []
 
-        # create a matrix holding all the characters to be printed to the term
-        self.char_grid: list[list[str]] = [ ['\n' if column == terminal.columns else ' ' for column in range(terminal.columns+1)] for row in range(terminal.rows)] 
-        self.char_grid[-1][-1] = ''  # remove last new line
+        # style id the terminal is in after everything emitted so far (None if unknown), see style.encode
+        self.current_style: int = None
 
+        # amount of bytes emitted by the last print and in total
+        self.bytes_written: int = 0
+        self.total_bytes_written: int = 0
+        # amount of prints skipped because the terminal wasn't ready
+        self.frames_skipped: int = 0
 
     def _create_first_frame(self) -> Frame:
         """
@@ -42,84 +81,309 @@ class FrameManager():
         # create a new frame taking up the entire terminal 
         initial_frame: Frame = Frame(self.terminal.rows, self.terminal.columns, (1, 1))  
         self.frames.append(initial_frame)  # append it to a list of all frames
-        self._register_frame(initial_frame)
+        self.layout = self.nodes[initial_frame] = FrameNode(initial_frame)
 
-
-    def _register_frame(self, frame: Frame) -> None:
+    def _on_resize(self, rows: int, columns: int) -> None:
         """
-        Registers a frame for terminal resize event 
-        Called when a frame is created
-        TODO: Don't resize individual frames, just subscribe the frame manager which resizes all the frames
+        Terminal resize handler - the only resize subscription, frames aren't subscribed individually
+        Recomputes the geometry of all frames in one pass, reallocates char_grid once and repaints once
         """
 
-        self.terminal.on_resize(frame.resize)
+        self.relayout(rows, columns)
+        self.char_grid.resize(rows, columns)
+        self.invalidate()
 
-    def _update_chars(self, target_frame: Frame = None) -> None:
+        # char_grid starts out blank, every frame has to be copied again - also those the layout left as they were
+        for frame in self.layers:
+            frame.mark_dirty()
+        self.print(full=True, force=True)
+
+    def compose(self, frames: list[Frame] = None) -> None:
         """
-        Updates the char_grid buffer with the char buffer of all frames or a specified frame
+        Copies the dirty rows of frames (all frames and overlays by default) into the char_grid buffer
+        Dirty widgets are drawn into their frames first, scrolls of frames are replayed (see _scroll_region)
+        Frames without dirty rows are skipped, every row is copied as a single slice
+        Rows covered by a higher layer only have their visible spans copied, fully covered ones are skipped
+        The screen rows written to are marked dirty in char_grid
         """
 
-        # iterate over all frames
-        for frame in self.frames:
-            # load target frame (exit out of for after)
-            if target_frame is not None:
-                frame = target_frame
+        start: float = profiler.start()
+
+        if frames is None:
+            frames = self.layers
+
+        if self.overlays and self.hit_grid is None:
+            self._build_hit_grid()
+
+        for frame in frames:
+            if frame.widget is not None and frame.widget.dirty:
+                frame.widget.render()
+
+            for top, bottom, lines in frame.scrolls:
+                self._scroll_region(frame, top, bottom, lines)
+            frame.scrolls.clear()
+
+            if not frame.dirty_rows:
+                continue
 
             # -1 because first character is considered (1, 1) but lists start from 0
             row_offset: int = frame.top_left_point[0] - 1
             column_offset: int = frame.top_left_point[1] - 1
+            occluded: dict[int, list[tuple[int, int]]] = self.occluded.get(frame)
+
+            if not occluded:
+                self.char_grid.blit(frame.chars, row_offset, column_offset, frame.dirty_rows)
+            else:
+                self.char_grid.blit(frame.chars, row_offset, column_offset, frame.dirty_rows - occluded.keys())
+
+                for row in frame.dirty_rows & occluded.keys():
+                    for span_start, span_end in occluded[row]:
+                        self.char_grid.copy_span(frame.chars, row, row + row_offset, span_start, span_end, column_offset)
+
+            frame.dirty_rows.clear()
+
+        if start:
+            profiler.record('compose', start)
+
+    def _scroll_region(self, frame: Frame, top: int, bottom: int, lines: int) -> None:
+        """
+        Replay the scroll of rows top to bottom (exclusive) of a frame on the screen
+        A frame spanning the whole terminal width is scrolled by the terminal itself (scroll region + SU/SD):
+        char_grid and front_grid are scrolled the same way, so only the exposed rows are left to be emitted
+        Any other frame (or one under an overlay) can't be scrolled by the terminal, so the scrolled rows are just repainted
+        """
+
+        screen_top: int = frame.top_left_point[0] - 1 + top
+        screen_bottom: int = frame.top_left_point[0] - 1 + bottom
+
+        # the terminal would scroll overlays on these rows too
+        covered: bool = any(
+            overlay.top_left_point[0] - 1 < screen_bottom and overlay.top_left_point[0] - 1 + overlay.rows > screen_top
+            for overlay in self.overlays
+        )
+
+        if (self.front_grid is None or frame.top_left_point[1] != 1 or frame.columns != self.char_grid.columns
+                or screen_top < 0 or screen_bottom > self.char_grid.rows or abs(lines) >= bottom - top or covered):
+            frame.dirty_rows.update(range(top, bottom))
+            return
+
+        self.char_grid.scroll(lines, screen_top, screen_bottom)
+        self.front_grid.scroll(lines, screen_top, screen_bottom)
+
+        # lines scrolled in get the current background, so go back to the default style first
+        if self.current_style != 0:
+            self.pending_output.append('\x1b[0m')
+            self.current_style = 0
+
+        # +1 because the terminal starts counting from (1, 1), scroll region is reset afterwards
+        self.pending_output.append(
+            f"\x1b[{screen_top + 1};{screen_bottom}r" + (f"\x1b[{lines}S" if lines > 0 else f"\x1b[{-lines}T") + "\x1b[r"
+        )
+
+    def _update_chars(self, target_frame: Frame = None) -> None:
+        """
+        Updates the char_grid buffer with the char buffer of all frames or a specified frame
+        Kept for compatibility, see compose
+        """
 
-            for row in range(frame.rows):
-                for column in range(frame.columns):
-                    # replace previous frame chars with new ones
-                    self.char_grid[row + row_offset][column + column_offset] = frame.chars[row][column]
+        self.compose(None if target_frame is None else [target_frame])
 
-            if target_frame is not None:
-                break
+    def print(self, full: bool = False, force: bool = False) -> bool:
+        """
+        Print char_grid to the terminal
+        By default only the cells changed since the last print are emitted (diff render)
+        full forces a complete repaint, which is also done on the first print
+
+        If the terminal is still writing the previous frame or the frame rate cap is hit, nothing is printed
+        The changes stay in char_grid, so they are coalesced into the next print (unless force is set)
+        Returns whether a frame was printed
+        """
+
+        self.compose()
+
+        if not force and not self.terminal.ready():
+            self.frames_skipped += 1
+            return False
+
+        start: float = profiler.start()
+
+        if full or self.front_grid is None:
+            buffer: str = self._full_render()
+        else:
+            buffer: str = self._diff_render()
+
+        if start:
+            profiler.record('render', start)
+
+        self.char_grid.dirty_rows.clear()
+
+        self.bytes_written = self.terminal.write(buffer) if buffer else 0
+        self.total_bytes_written += self.bytes_written
+
+        return True
+
+    def invalidate(self) -> None:
+        """ Forget what is on screen, forcing the next print to repaint everything """
+
+        self.front_grid = None
+
+    def _full_render(self) -> str:
+        """
+        Convert the whole char_grid to a string and sync the front buffer with it
+        Styles are emitted only where they change (see style.encode)
+        """
+
+        self.front_grid = self.char_grid.copy()
+        self.pending_output.clear()  # everything is repainted anyway
+
+        output, self.current_style = self.full_output()
 
-    def print(self) -> None:
-        """ Convert char_grid to a string via list comprehension and print it """
+        return output
 
-        self._update_chars()
+    def full_output(self) -> tuple[str, int]:
+        """
+        Return the output repainting the whole char_grid (whatever the terminal was in) and the style it ends in
+        Doesn't change any state - also used to check diff renders against full repaints (see headless)
+        """
+
+        grid: CellBuffer = self.char_grid
+        rows: list[str] = []
+        current: int = None  # start from a reset, whatever the terminal was in
+
+        for row in range(grid.rows):
+            text, current = encode(grid.codes[row], grid.styles[row], 0, grid.columns, current) if grid.columns else ('', current)
+            rows.append(text)
+
+        # move the cursor home first, so consecutive repaints don't scroll
+        return '\x1b[H' + '\n'.join(rows), current
 
+    def _diff_render(self) -> str:
+        """
+        Compare dirty rows of char_grid (back buffer) against front_grid (front buffer)
+        Return cursor positioning escape sequences followed by the changed runs of chars
+        A style is emitted only when it differs from the one the terminal is in already
+        """
+
+        columns: int = self.char_grid.columns
+        buffer: list[str] = self.pending_output  # terminal scrolls go first, the diff is relative to them
+        self.pending_output = []
+
+        for row in sorted(self.char_grid.dirty_rows):
+            back_row = self.char_grid.codes[row]
+            front_row = self.front_grid.codes[row]
+            back_styles = self.char_grid.styles[row]
+            front_styles = self.front_grid.styles[row]
+
+            # quick check of the whole row at once
+            if back_row == front_row and back_styles == front_styles:
+                continue
+
+            column: int = 0
+            while column < columns:
+                if back_row[column] == front_row[column] and back_styles[column] == front_styles[column]:
+                    column += 1
+                    continue
+
+                # find the end of the changed run
+                # short unchanged gaps are included, as they are cheaper than a new cursor move
+                start: int = column
+                end: int = column + 1
+                gap: int = 0
+                column += 1
+                while column < columns and gap <= self.RUN_GAP:
+                    if back_row[column] == front_row[column] and back_styles[column] == front_styles[column]:
+                        gap += 1
+                    else:
+                        gap = 0
+                        end = column + 1
+                    column += 1
+
+                # never start or end a run in the middle of a wide character - it's printed as a whole
+                while start > 0 and back_row[start] == CONTINUATION:
+                    start -= 1
+                while end < columns and back_row[end] == CONTINUATION:
+                    end += 1
+
+                # +1 because the terminal starts counting from (1, 1)
+                buffer.append(f"\x1b[{row + 1};{start + 1}H")
+                text, self.current_style = encode(back_row, back_styles, start, end, self.current_style)
+                buffer.append(text)
+                front_row[start:end] = back_row[start:end]
+                front_styles[start:end] = back_styles[start:end]
+
+        return ''.join(buffer)
+
+    def relayout(self, rows: int = None, columns: int = None) -> None:
+        """
+        Lay out the layout tree in a screen of rows and columns (the current size by default)
+        Subtrees whose rectangle didn't change and weren't modified are skipped
         """
-        # Non-comprehension sollution
 
-        buffer: str = ''
-        for row in self.char_grid:
-            for char in row:
-                buffer += f"{char}"
+        start: float = profiler.start()
 
-        self.terminal.write(buffer)
+        if rows is None:
+            rows, columns = self.char_grid.rows, self.char_grid.columns
+
+        self.layout.layout((0, 0, rows, columns))
+        self.hit_grid = None
+        self.occluded = {}
+
+        if start:
+            profiler.record('layout', start)
+
+    def split(self, frame: Frame, orientation: str, count: int = 2, ratios: list[float] = None) -> list[Frame]:
         """
-        
-        self.terminal.write(''.join([char for row in self.char_grid for char in row]))
+        Split a frame into count frames, frame itself stays the first (top/left) one
+        orientation is SplitNode.VERTICAL (" x|y ") or SplitNode.HORIZONTAL (x above y)
+        ratios gives the share of every frame (equal by default), for example [1, 2] or [0.3, 0.7]
+        Returns the newly created frames
+        """
+
+        node: FrameNode = self.nodes[frame]
+        parent: SplitNode = node.parent
+
+        # new frames get their geometry from the layout
+        new_frames: list[Frame] = [Frame(0, 0, frame.top_left_point) for count in range(count - 1)]
+        new_nodes: list[FrameNode] = [FrameNode(new_frame) for new_frame in new_frames]
+
+        split_node: SplitNode = SplitNode(orientation, [node] + new_nodes, ratios)
+
+        # put the split where the frame's leaf was
+        if parent is None:
+            self.layout = split_node
+        else:
+            parent.replace(node, split_node)
+
+        for new_frame, new_node in zip(new_frames, new_nodes):
+            self.frames.append(new_frame)
+            self.nodes[new_frame] = new_node
 
-    def splitv(self, frame: Frame) -> Frame:
+        # only the split subtree has to be laid out, it takes the frame's old place
+        start: float = profiler.start()
+        split_node.invalidate()
+        split_node.layout(node.rect)
+
+        if start:
+            profiler.record('layout', start)
+        self.hit_grid = None
+        self.occluded = {}
+
+        return new_frames
+
+    def splitv(self, frame: Frame, ratio: float = 0.5) -> Frame:
         """
         Splits a frame vertically, creating 2 frames
-        TODO: More arguments such as % % split..
         if there is frame x " x "
         after split and a new frame y will be " x|y "
-
-        TODO: three+ way event splits..
+        ratio is the share of x (when even, x gets the floor of half the columns)
+        For three+ way splits use split
         """
-        # Create a new frame in the above described way
-        new_frame: Frame = Frame(frame.rows, ceil(frame.columns/2), (frame.top_left_point[0], frame.top_left_point[1] + floor(frame.columns/2)))
-        self.frames.append(new_frame)
-        
-        # TODO Resize old frame -> Also take in account dividing odd numbers, use math.floor or ceil
-        frame.resize(frame.rows, floor(frame.columns/2), frame.top_left_point)
-
-        # register new frame
-        self._register_frame(new_frame)
 
-        return new_frame
+        return self.split(frame, SplitNode.VERTICAL, 2, [ratio, 1 - ratio])[0]
 
-    def splith(self, frame: Frame) -> Frame:
+    def splith(self, frame: Frame, ratio: float = 0.5) -> Frame:
         """
         Splits a frame horisontally, creating 2 frames
-        TODO: More arguments such as % % split..
         if there is frame x 
         "   "
         " x "
@@ -128,24 +392,244 @@ class FrameManager():
         " x "
         "---"
         " y "
+        ratio is the share of x (when even, x gets the floor of half the rows)
+        For three+ way splits use split
+        """
+
+        return self.split(frame, SplitNode.HORIZONTAL, 2, [ratio, 1 - ratio])[0]
+
+    def set_min_size(self, frame: Frame, rows: int, columns: int) -> None:
+        """ Set the minimum size of a frame, takes effect on the next relayout """
+
+        node: FrameNode = self.nodes[frame]
+        node.min_rows = rows
+        node.min_columns = columns
+        node.invalidate()
+
+    def set_ratios(self, frame: Frame, ratios: list[float]) -> None:
+        """ Change the ratios of the split frame is directly in and lay it out again """
+
+        self.nodes[frame].parent.set_ratios(ratios)
+        self.relayout()
+
+    @property
+    def layers(self) -> list[Frame]:
+        """ All frames from the bottom up - the tiled frames, then the overlays by z """
+
+        return self.frames + self.overlays
+
+    def _clip(self, frame: Frame) -> tuple[int, int, int, int]:
+        """ Screen area of a frame cut to the screen - (top, left, bottom, right), bottom and right exclusive """
+
+        return (
+            max(0, frame.top_left_point[0] - 1),
+            max(0, frame.top_left_point[1] - 1),
+            min(self.char_grid.rows, frame.top_left_point[0] - 1 + frame.rows),
+            min(self.char_grid.columns, frame.top_left_point[1] - 1 + frame.columns),
+        )
+
+    def _build_hit_grid(self) -> None:
+        """
+        Build the hit test grid by painting the area of every frame with its index in layers
+        Higher layers are painted last, so they are on top
+        Every row of a frame is a single slice assignment
+        With overlays the visible spans of partially covered rows are collected too (see occluded)
+        """
+
+        rows, columns = self.char_grid.rows, self.char_grid.columns
+        self.hit_grid = [array('H', [0]) * columns for row in range(rows)]
+        self.occluded = {}
+
+        layers: list[Frame] = self.layers
+
+        for index, frame in enumerate(layers):
+            top, left, bottom, right = self._clip(frame)
+
+            if left >= right:
+                continue
+
+            fill: array = array('H', [index + 1]) * (right - left)
+            for row in range(top, bottom):
+                self.hit_grid[row][left:right] = fill
+
+        if not self.overlays:
+            return  # tiled frames don't overlap
+
+        for index, frame in enumerate(layers):
+            top, left, bottom, right = self._clip(frame)
+
+            if left >= right:
+                continue
+
+            fill: array = array('H', [index + 1]) * (right - left)
+            spans: dict[int, list[tuple[int, int]]] = {}
+
+            for row in range(top, bottom):
+                cells: array = self.hit_grid[row]
+                if cells[left:right] == fill:
+                    continue  # fully visible
+
+                # frame columns of the runs of cells still owned by this frame
+                visible: list[tuple[int, int]] = []
+                column: int = left
+                while column < right:
+                    if cells[column] != index + 1:
+                        column += 1
+                        continue
+                    start: int = column
+                    while column < right and cells[column] == index + 1:
+                        column += 1
+                    visible.append((start - frame.top_left_point[1] + 1, column - frame.top_left_point[1] + 1))
+
+                spans[row - frame.top_left_point[0] + 1] = visible
+
+            if spans:
+                self.occluded[frame] = spans
+
+    def open_overlay(self, rows: int, columns: int, top_left_point: tuple[int], z: int = None) -> Frame:
+        """
+        Create a frame floating above the tiled frames (a popup, dialog or menu) and return it
+        top_left_point is 1 based like other frames, z orders overlays (on top of all others by default)
+        """
+
+        if z is None:
+            z = max(self.z.values(), default=0) + 1
+
+        overlay: Frame = Frame(rows, columns, top_left_point)
 
-        TODO: three+ way event splits..
+        # keep overlays sorted by z, equal z stacks on top
+        position: int = len(self.overlays)
+        while position and self.z[self.overlays[position - 1]] > z:
+            position -= 1
+
+        self.overlays.insert(position, overlay)
+        self.z[overlay] = z
+        self.hit_grid = None  # a new frame is all dirty, so it gets copied on the next compose
+
+        return overlay
+
+    def close_overlay(self, overlay: Frame) -> None:
+        """ Remove an overlay, the region it covered is restored from the layers below """
+
+        self.overlays.remove(overlay)
+        del self.z[overlay]
+        self._restore(*self._clip(overlay))
+
+    def move_overlay(self, overlay: Frame, top_left_point: tuple[int]) -> None:
+        """ Move an overlay, only the region it left is restored from the layers below """
+
+        old: tuple[int, int, int, int] = self._clip(overlay)
+
+        overlay.top_left_point = top_left_point
+        overlay.mark_dirty()
+        self._restore(*old)
+
+    def raise_overlay(self, overlay: Frame, z: int = None) -> None:
+        """ Move an overlay above all others (or to z) """
+
+        self.overlays.remove(overlay)
+        del self.z[overlay]
+
+        if z is None:
+            z = max(self.z.values(), default=0) + 1
+
+        position: int = len(self.overlays)
+        while position and self.z[self.overlays[position - 1]] > z:
+            position -= 1
+
+        self.overlays.insert(position, overlay)
+        self.z[overlay] = z
+        self._restore(*self._clip(overlay))  # it covers other layers now (or they cover it)
+
+    def _restore(self, top: int, left: int, bottom: int, right: int) -> None:
+        """
+        Copy a screen area (bottom and right exclusive) from whatever is on top of it now
+        Only that area is touched - every row is copied as runs of cells owned by the same frame
+        Wide characters across the edges of the area are copied whole, a half of one would be blanked
+        """
+
+        self._build_hit_grid()
+        layers: list[Frame] = self.layers
+
+        for row in range(top, bottom):
+            cells: array = self.hit_grid[row]
+            column: int = left
+            end: int = right
+
+            if column > 0 and self._layer_code(layers, row, column) == CONTINUATION:
+                column -= 1
+            if end < self.char_grid.columns and self._layer_code(layers, row, end) == CONTINUATION:
+                end += 1
+
+            while column < end:
+                index: int = cells[column]
+                start: int = column
+                while column < end and cells[column] == index:
+                    column += 1
+
+                if index == 0:
+                    self.char_grid.clear_span(row, start, column)
+                    continue
+
+                frame: Frame = layers[index - 1]
+                self.char_grid.copy_span(
+                    frame.chars, row - frame.top_left_point[0] + 1, row,
+                    start - frame.top_left_point[1] + 1, column - frame.top_left_point[1] + 1, frame.top_left_point[1] - 1
+                )
+
+    def _layer_code(self, layers: list[Frame], row: int, column: int) -> int:
+        """ Code of the cell of the topmost layer at a screen position (0 based), blank if there's no layer """
+
+        index: int = self.hit_grid[row][column]
+        if index == 0:
+            return BLANK
+
+        frame: Frame = layers[index - 1]
+        return frame.chars.codes[row - frame.top_left_point[0] + 1][column - frame.top_left_point[1] + 1]
+
+    def frame_at(self, row: int, column: int) -> Frame:
+        """
+        Return the topmost frame (overlays included) at a terminal position (1 based like mouse coordinates), None if there is none
+        A constant time lookup in the hit test grid
+        """
+
+        if self.hit_grid is None:
+            self._build_hit_grid()
+
+        # -1 because the terminal starts counting from (1, 1)
+        if not (0 < row <= len(self.hit_grid) and 0 < column <= self.char_grid.columns):
+            return None
+
+        index: int = self.hit_grid[row - 1][column - 1]
+
+        return self.layers[index - 1] if index else None
+
+    def dispatch_mouse(self, event: MouseEvent, row: int, column: int) -> Frame:
         """
-        # Create a new frame in the above described way
-        new_frame: Frame = Frame(ceil(frame.rows/2), frame.columns, (frame.top_left_point[0] + floor(frame.rows/2), frame.top_left_point[1]))
-        self.frames.append(new_frame)
+        Call the mouse listeners of the frame under (row, column) with the event and the position inside the frame
+        Returns the frame the event was dispatched to (None if there is no frame there)
+        """
+
+        frame: Frame = self.frame_at(row, column)
+
+        if frame is not None:
+            for callback in frame.mouse_listeners:
+                invoke(callback, event, row - frame.top_left_point[0], column - frame.top_left_point[1])
+
+        return frame
 
-        # TODO Resize old frame -> Also take in account dividing odd numbers, use math.floor or ceil
-        frame.resize(floor(frame.rows/2), frame.columns, frame.top_left_point)
+    def attach_mouse(self, mouse: Mouse) -> None:
+        """ Subscribe to all events of a mouse, dispatching them to the frames under the pointer """
 
-        # register new frame
-        self._register_frame(new_frame)
+        def dispatch() -> None:
+            self.dispatch_mouse(mouse.last_event, mouse.row, mouse.column)
 
-        return new_frame
+        for event in MouseEvent:
+            mouse.subscribe(event, dispatch)
 
     def __str__(self) -> str:
         """ Get string of char_grid in the way you would get it printed """
-        return ''.join([char for row in self.char_grid for char in row])
+        return str(self.char_grid)
 
 
 if __name__ == '__main__':
@@ -170,6 +654,6 @@ if __name__ == '__main__':
     # frame_manager.print() 
     
     # manual print (no \n when program exits (no loop due to no events in example
-    frame_manager._update_chars()
+    frame_manager.compose()
     print(frame_manager, end='')
     input()
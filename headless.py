@@ -0,0 +1,392 @@
+import os
+import re
+from os import terminal_size
+from time import monotonic
+
+from terminal import TerminalBackend
+from unicode_width import graphemes
+
+
+# cell style - (fg, bg, attributes), colors as in style.Color
+DEFAULT_STYLE: tuple = (None, None, frozenset())
+
+# SGR parameter -> attribute it turns on / attributes it turns off
+SGR_ON: dict[int, str] = {1: 'bold', 2: 'dim', 3: 'italic', 4: 'underline', 5: 'blink', 7: 'reverse', 9: 'strikethrough'}
+SGR_OFF: dict[int, set[str]] = {
+    22: {'bold', 'dim'}, 23: {'italic'}, 24: {'underline'}, 25: {'blink'}, 27: {'reverse'}, 29: {'strikethrough'},
+}
+
+# a piece of output - CSI sequence (private marker, parameters, final byte), other escape, control character or text
+TOKEN: re.Pattern = re.compile(
+    r'\x1b\[([?>=]?)([\d;:]*)([@-~])|\x1b([^\[])|([\x00-\x1a\x1c-\x1f\x7f])|([^\x00-\x1f\x7f]+)'
+)
+
+
+class Screen:
+    """
+    In-memory model of a terminal screen, built by feeding it the output a terminal would get
+    Understands what the frame manager emits - text (wide characters and clusters included, with autowrap),
+    CR/LF, cursor movement (CUP and relative), SGR, scroll regions (DECSTBM), scrolling (SU/SD) and erasing (ED/EL)
+    Other sequences are ignored
+
+    Every cell holds its text ('' for the right half of a wide character) and style (see DEFAULT_STYLE)
+    """
+
+    def __init__(self, rows: int, columns: int) -> None:
+        self.rows: int = rows
+        self.columns: int = columns
+
+        self.cells: list[list[str]] = [[' '] * columns for row in range(rows)]
+        self.styles: list[list[tuple]] = [[DEFAULT_STYLE] * columns for row in range(rows)]
+
+        self.row: int = 0
+        self.column: int = 0
+        self.wrap_pending: bool = False  # the last column was written, the next character goes to the next line
+        self.style: tuple = DEFAULT_STYLE
+        self.saved: tuple[int, int] = (0, 0)
+
+        # scroll region, bottom exclusive
+        self.top: int = 0
+        self.bottom: int = rows
+
+        self.buffer: str = ''  # incomplete escape sequence at the end of the last feed
+
+    def resize(self, rows: int, columns: int) -> None:
+        """ Change the size, the content is kept where it fits """
+
+        self.cells = [(row[:columns] + [' '] * (columns - len(row))) for row in self.cells[:rows]]
+        self.styles = [(row[:columns] + [DEFAULT_STYLE] * (columns - len(row))) for row in self.styles[:rows]]
+        self.cells += [[' '] * columns for row in range(rows - len(self.cells))]
+        self.styles += [[DEFAULT_STYLE] * columns for row in range(rows - len(self.styles))]
+
+        self.rows, self.columns = rows, columns
+        self.row, self.column = min(self.row, rows - 1), min(self.column, columns - 1)
+        self.top, self.bottom = 0, rows
+        self.wrap_pending = False
+
+    def feed(self, output: str) -> None:
+        """ Apply output to the screen, an escape sequence cut off at the end is completed by the next feed """
+
+        output = self.buffer + output
+        self.buffer = ''
+        position: int = 0
+
+        while position < len(output):
+            if output[position] == '\x1b' and self._incomplete(output[position:]):
+                self.buffer = output[position:]  # wait for the rest
+                return
+
+            match: re.Match = TOKEN.match(output, position)
+
+            if match is None:
+                position += 1  # malformed sequence, skip the escape
+                continue
+
+            private, parameters, final, escape, control, text = match.groups()
+
+            if text is not None:
+                self._text(text)
+            elif final is not None:
+                if not private:
+                    self._csi(final, [int(parameter) if parameter else None for parameter in parameters.replace(':', ';').split(';')])
+            elif escape is not None:
+                self._escape(escape)
+            else:
+                self._control(control)
+
+            position = match.end()
+
+    @staticmethod
+    def _incomplete(rest: str) -> bool:
+        """ Whether rest could be the start of an escape sequence """
+
+        return rest == '\x1b' or re.fullmatch(r'\x1b\[[?>=]?[\d;:]*', rest) is not None
+
+    def _blank(self) -> tuple[str, tuple]:
+        """ Cell left by erasing - blank with the current background """
+
+        return ' ', (None, self.style[1], frozenset())
+
+    def _text(self, text: str) -> None:
+        for cluster, width in graphemes(text):
+            if self.wrap_pending or (width == 2 and self.column == self.columns - 1):
+                self.column = 0
+                self._linefeed()
+                self.wrap_pending = False
+
+            self._put(self.column, cluster, width)
+
+            if self.column + width >= self.columns:
+                self.column = self.columns - 1
+                self.wrap_pending = True
+            else:
+                self.column += width
+
+    def _put(self, column: int, cluster: str, width: int) -> None:
+        """ Write a cluster into a cell (and the next one if it's wide), breaking wide characters it overlaps """
+
+        cells: list[str] = self.cells[self.row]
+        styles: list[tuple] = self.styles[self.row]
+
+        for cell in range(column, min(self.columns, column + width)):
+            if cells[cell] == '' and cell > 0:
+                cells[cell - 1] = ' '  # right half of a wide character, its left half goes too
+            if cell + 1 < self.columns and cells[cell + 1] == '':
+                cells[cell + 1] = ' '  # left half of a wide character, its right half goes too
+
+        cells[column] = cluster
+        styles[column] = self.style
+
+        if width == 2 and column + 1 < self.columns:
+            cells[column + 1] = ''
+            styles[column + 1] = self.style
+
+    def _linefeed(self) -> None:
+        if self.row == self.bottom - 1:
+            self._scroll(1)
+        elif self.row < self.rows - 1:
+            self.row += 1
+
+    def _scroll(self, lines: int) -> None:
+        """ Scroll the scroll region up by lines (down if negative) """
+
+        height: int = self.bottom - self.top
+        lines = max(-height, min(height, lines))
+        char, style = self._blank()
+
+        for rows in (self.cells, self.styles):
+            blank: object = char if rows is self.cells else style
+            region: list[list] = rows[self.top:self.bottom]
+
+            if lines > 0:
+                region = region[lines:] + [[blank] * self.columns for row in range(lines)]
+            else:
+                region = [[blank] * self.columns for row in range(-lines)] + region[:height + lines]
+
+            rows[self.top:self.bottom] = region
+
+    def _erase(self, row: int, start: int, end: int) -> None:
+        char, style = self._blank()
+        self.cells[row][start:end] = [char] * (end - start)
+        self.styles[row][start:end] = [style] * (end - start)
+
+    def _control(self, control: str) -> None:
+        if control == '\n':
+            self.column = 0  # the tty turns LF into CRLF (onlcr)
+            self._linefeed()
+        elif control == '\r':
+            self.column = 0
+        elif control == '\b':
+            self.column = max(0, self.column - 1)
+        elif control == '\t':
+            self.column = min(self.columns - 1, (self.column // 8 + 1) * 8)
+        else:
+            return
+
+        self.wrap_pending = False
+
+    def _escape(self, escape: str) -> None:
+        if escape == '7':
+            self.saved = (self.row, self.column)
+        elif escape == '8':
+            self.row, self.column = self.saved
+            self.wrap_pending = False
+        elif escape == 'c':
+            self.__init__(self.rows, self.columns)
+
+    def _csi(self, final: str, parameters: list[int]) -> None:
+        first: int = parameters[0]
+        count: int = first or 1  # missing and 0 both mean 1 for movement
+
+        if final in 'Hf':
+            row: int = first or 1
+            column: int = (parameters[1] if len(parameters) > 1 else None) or 1
+            self.row = min(self.rows, row) - 1
+            self.column = min(self.columns, column) - 1
+        elif final == 'A':
+            self.row = max(0, self.row - count)
+        elif final == 'B':
+            self.row = min(self.rows - 1, self.row + count)
+        elif final == 'C':
+            self.column = min(self.columns - 1, self.column + count)
+        elif final == 'D':
+            self.column = max(0, self.column - count)
+        elif final == 'G':
+            self.column = min(self.columns, count) - 1
+        elif final == 'd':
+            self.row = min(self.rows, count) - 1
+        elif final == 'm':
+            self._sgr(parameters)
+            return  # doesn't touch the cursor
+        elif final == 'r':
+            top: int = first or 1
+            bottom: int = (parameters[1] if len(parameters) > 1 else None) or self.rows
+            if top < bottom <= self.rows:
+                self.top, self.bottom = top - 1, bottom
+            self.row = self.column = 0
+        elif final == 'S':
+            self._scroll(count)
+        elif final == 'T':
+            self._scroll(-count)
+        elif final == 'J':
+            if first == 2 or first == 3:
+                for row in range(self.rows):
+                    self._erase(row, 0, self.columns)
+            elif first == 1:
+                for row in range(self.row):
+                    self._erase(row, 0, self.columns)
+                self._erase(self.row, 0, self.column + 1)
+            else:
+                self._erase(self.row, self.column, self.columns)
+                for row in range(self.row + 1, self.rows):
+                    self._erase(row, 0, self.columns)
+        elif final == 'K':
+            if first == 2:
+                self._erase(self.row, 0, self.columns)
+            elif first == 1:
+                self._erase(self.row, 0, self.column + 1)
+            else:
+                self._erase(self.row, self.column, self.columns)
+        else:
+            return
+
+        self.wrap_pending = False
+
+    def _sgr(self, parameters: list[int]) -> None:
+        fg, bg, attributes = self.style
+        attributes = set(attributes)
+        parameters = [parameter or 0 for parameter in parameters]
+
+        index: int = 0
+        while index < len(parameters):
+            parameter: int = parameters[index]
+
+            if parameter == 0:
+                fg, bg, attributes = None, None, set()
+            elif parameter in SGR_ON:
+                attributes.add(SGR_ON[parameter])
+            elif parameter in SGR_OFF:
+                attributes -= SGR_OFF[parameter]
+            elif 30 <= parameter <= 37:
+                fg = parameter - 30
+            elif 40 <= parameter <= 47:
+                bg = parameter - 40
+            elif 90 <= parameter <= 97:
+                fg = parameter - 90 + 8
+            elif 100 <= parameter <= 107:
+                bg = parameter - 100 + 8
+            elif parameter == 39:
+                fg = None
+            elif parameter == 49:
+                bg = None
+            elif parameter in (38, 48):
+                # extended color - 5;n (palette) or 2;r;g;b (truecolor)
+                if parameters[index + 1:index + 2] == [5]:
+                    color = parameters[index + 2]
+                    index += 2
+                else:
+                    color = tuple(parameters[index + 2:index + 5])
+                    index += 4
+
+                if parameter == 38:
+                    fg = color
+                else:
+                    bg = color
+
+            index += 1
+
+        self.style = (fg, bg, frozenset(attributes))
+
+    def row_text(self, row: int) -> str:
+        """ Text of a row as it's shown """
+
+        return ''.join(self.cells[row])
+
+    def text(self) -> str:
+        return '\n'.join(self.row_text(row) for row in range(self.rows))
+
+    def style_at(self, row: int, column: int) -> tuple:
+        return self.styles[row][column]
+
+    def differences(self, other: 'Screen') -> list[int]:
+        """ Rows whose text or styles differ from the ones of another screen of the same size """
+
+        return [
+            row for row in range(self.rows)
+            if self.cells[row] != other.cells[row] or self.styles[row] != other.styles[row]
+        ]
+
+    def __str__(self) -> str:
+        return self.text()
+
+
+class HeadlessTerminal(TerminalBackend):
+    """
+    Terminal backend without a terminal - output is applied to an in-memory Screen right away
+    Renders can be tested, benchmarked and snapshotted at any size, resizes are simulated with resize
+
+        terminal = HeadlessTerminal(24, 80)
+        frame_manager = FrameManager(terminal)
+        ...
+        frame_manager.print()
+        terminal.screen.row_text(0)
+    """
+
+    def __init__(self, rows: int = 24, columns: int = 80, max_fps: float = float('inf')) -> None:
+        super().__init__(rows, columns, max_fps)
+
+        self.screen: Screen = Screen(rows, columns)
+        self.bytes_written: int = 0
+
+        self._resize_pipe: tuple[int, int] = None  # created when someone waits on it
+
+    def resize(self, rows: int, columns: int) -> None:
+        """ Simulate the terminal being resized, listeners are called right away """
+
+        self.screen.resize(rows, columns)
+        self.resized(terminal_size((columns, rows)))
+
+    def fileno(self) -> int:
+        """ Return an fd for selectors, it never becomes readable as resizes are handled right away """
+
+        if self._resize_pipe is None:
+            self._resize_pipe = os.pipe()
+
+        return self._resize_pipe[0]
+
+    def handle_resize_signal(self) -> None:
+        pass
+
+    def write(self, buf: str) -> int:
+        """ Apply output to the screen, returns the amount of bytes it would take """
+
+        self.screen.feed(buf)
+        self.last_frame = monotonic()
+
+        written: int = len(buf.encode())
+        self.bytes_written += written
+
+        return written
+
+    def flush(self, block: bool = False) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self._resize_pipe is not None:
+            for fd in self._resize_pipe:
+                os.close(fd)
+            self._resize_pipe = None
+
+
+def check_render(frame_manager: 'FrameManager') -> list[int]:
+    """
+    Compare the screen of a frame manager's headless terminal with a full repaint of its char_grid
+    Returns the rows which differ - empty when the diff renders reproduced the full repaint exactly
+    """
+
+    terminal: HeadlessTerminal = frame_manager.terminal
+
+    reference: Screen = Screen(terminal.screen.rows, terminal.screen.columns)
+    reference.feed(frame_manager.full_output()[0])
+
+    return terminal.screen.differences(reference)
@@ -1,8 +1,17 @@
+import atexit
+import termios
+import tty
 from enum import Enum, auto
-from os import system, read
+from os import isatty, read
 from sys import stdout, stdin
+from time import monotonic
 from typing import Callable, Any
 
+from callbacks import invoke
+from keybindings import KeyBindings
+from input_parser import ESC, InputParser, KeyEvent, MotionCoalescer, MouseReport, PasteEvent
+from profiler import profiler
+
 
 class Input:
     """
@@ -10,59 +19,171 @@ class Input:
     Listening and reading from input and event callback subscriptions(TODO)
     """
 
-    def __init__(self) -> None:
+    # bytes read at once, a burst of mouse reports fits in a single read
+    READ_SIZE: int = 4096
+
+    def __init__(self, coalescer: MotionCoalescer = None, escape_timeout: float = 0.05, fd: int = None) -> None:
+        # fd input is read from, stdin by default
+        self.fd: int = stdin.fileno() if fd is None else fd
+
         self.mouse: Mouse = Mouse() 
         self.keyboard: Keyboard = Keyboard()
+        self.parser: InputParser = InputParser()
+        # collapses mouse motion floods before they are dispatched
+        self.coalescer: MotionCoalescer = MotionCoalescer() if coalescer is None else coalescer
+
+        # a lone ESC is the escape key if nothing follows it within escape_timeout seconds
+        # otherwise it's the start of an escape sequence (arrows, mouse...)
+        self.escape_timeout: float = escape_timeout
+        self.escape_deadline: float = None
+
+        self.eof: bool = False  # fd was closed (hangup, end of a pipe), nothing will come anymore
+
+        # terminal mode before start_listen, restored by stop_listen (None when not listening)
+        self.saved_mode: list = None
+        self.listening: bool = False
+        self._atexit: bool = False  # stop_listen is registered to run at exit
 
+    def fileno(self) -> int:
+        """ Return the fd input is read from (for select/selectors, next to Terminal) """
+
+        return self.fd
 
     def start_listen(self) -> None: 
         """
         Start listening for input
         Essentially allows the mouse to be used
+        Switches the terminal to cbreak mode (no line buffering, no echo, Ctrl-C still works) with termios directly
+        The previous mode is restored by stop_listen, which also runs at exit - use Input as a context manager
+        Does nothing if already listening
         """
 
-        system("stty -icanon")  # enable shell input
-        system("stty -echo")  # disable characters printing
+        if self.listening:
+            return
+
+        if isatty(self.fd):
+            self.saved_mode = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd, termios.TCSANOW)  # enable shell input, disable characters printing
+
+        self.listening = True
+        if not self._atexit:
+            atexit.register(self.stop_listen)  # the terminal mustn't stay broken if the program dies
+            self._atexit = True
 
         stdout.write("\x1b[?1000;1003;1006;1015h")  # trap input
+        stdout.write("\x1b[?2004h")  # bracketed paste
         stdout.flush()  # flush stdout buffer
 
     def stop_listen(self) -> None:
-        """
-        TODO: Call on program exit
-        """
+        """ Stop listening and restore the terminal, does nothing if not listening """
+
+        if not self.listening:
+            return
+
+        self.listening = False
 
         stdout.write("\x1b[?1000;1003;1006;1015l")  # disable trap 
+        stdout.write("\x1b[?2004l")  # disable bracketed paste
         stdout.flush()  # flush stdout buffer
-        system("stty echo")  # enable characters printing
 
-    def read_input(self) -> str:
-        """
-        Reads 16 bytes from stdin (max you can get when reading mouse input is that much)
-        TODO: option to disable mouse to optimize reading to 1 byte at a time (shouldn't really make a difference but who knows)
+        if self.saved_mode is not None:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved_mode)  # enable characters printing
+            self.saved_mode = None
+
+    def __enter__(self) -> 'Input':
+        self.start_listen()
+        return self
 
-        Checks if the read input belongs to a mouse or a keyboard and saves to them accordingly
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop_listen()
+
+    def read_input(self) -> list:
+        """
+        Reads up to READ_SIZE bytes from fd (stdin) and feeds them to the input parser
+        Mouse motion is coalesced (see MotionCoalescer), every other complete event is
+        passed to the mouse or keyboard accordingly
+        An event cut off at the end of the read is completed by the next read
 
         Mouse input would look something like:
         \x1b[<35;24;54M
         where 35 is the mouse event code (move pointer)
-        24 is the row as a character in the terminal
-        54 is the column in characters
+        24 is the column as a character in the terminal
+        54 is the row in characters
         M indicates that the input isn't released
         m would be lower case on button release
+
+        At the end of input (an empty read) eof is set and whatever is pending is dispatched as it is
+
+        Returns the dispatched events
         """
 
-        line: str = read(stdin.fileno(), 16).decode()  # convert bytes to str
+        start: float = profiler.start()
 
-        if len(line) > 1:  # Input from mouse - format it 
-            line = line.split("\x1b[<", -1)[-1]  # remove escape if there is one
-            line: list[str] = line.split(";", -1)  # split into an array of code, row, column
-            line.append(line[-1][-1])  # add M/m as last element of array
-            line[-2] = line[-2][:-1]  # Remove the M from columns
+        now: float = monotonic()
+        data: bytes = read(self.fd, self.READ_SIZE)
 
-            self.mouse.update(line)  # update mouse coords and callback on event
+        if data:
+            events: list = self.parser.feed(data)
         else:
-            self.keyboard.update(line)
+            self.eof = True
+            events = self.parser.flush()
+
+        events = self.coalescer.coalesce(events, now)
+        self.dispatch(events)
+
+        # an incomplete escape sequence - wait a bit for the rest before calling it the escape key
+        if self.parser.pending and self.parser.buffer[0] == ESC:
+            self.escape_deadline = now + self.escape_timeout
+        else:
+            self.escape_deadline = None
+
+        if start:
+            profiler.record('read_input', start)
+
+        return events
+
+    def timeout(self) -> float:
+        """
+        Seconds until tick should be called, None if nothing is waiting
+        Things waiting are held back motion, a lone ESC and an unfinished key chord
+        """
+
+        now: float = monotonic()
+        timeouts: list[float] = [
+            timeout for timeout in (
+                self.coalescer.timeout(now),
+                None if self.escape_deadline is None else max(0, self.escape_deadline - now),
+                self.keyboard.bindings.timeout(now),
+            ) if timeout is not None
+        ]
+
+        return min(timeouts) if timeouts else None
+
+    def tick(self) -> list:
+        """ Dispatch held back events whose time has come and expire timed out key chords, returns the events """
+
+        now: float = monotonic()
+        events: list = self.coalescer.flush(now)
+
+        if self.escape_deadline is not None and now >= self.escape_deadline:
+            self.escape_deadline = None
+            events += self.parser.flush()
+
+        self.dispatch(events)
+        self.keyboard.bindings.expire(now)
+
+        return events
+
+    def dispatch(self, events: list) -> None:
+        """ Pass parsed events to the mouse or keyboard """
+
+        for event in events:
+            if isinstance(event, MouseReport):
+                self.mouse.update(event)  # update mouse coords and callback on event
+            elif isinstance(event, KeyEvent):
+                self.keyboard.update(event.key)
+            elif isinstance(event, PasteEvent):
+                self.keyboard.paste(event.text)
 
 
 class MouseEvent(Enum):
@@ -104,6 +225,103 @@ class MouseEvent(Enum):
     """ Downwards scroll """
     SCROLL_DOWN: str = "65M"
 
+    """ Leftwards scroll (horizontal wheel) """
+    SCROLL_LEFT: str = "66M"
+
+    """ Rightwards scroll (horizontal wheel) """
+    SCROLL_RIGHT: str = "67M"
+
+    """ One of the extra buttons (8-11) is pressed, MouseInput.button says which """
+    EXTRA_CLICK_HOLD: str = "128M"
+
+    """ Mouse pointer moves while an extra button is held """
+    EXTRA_CLICK_DRAG: str = "160M"
+
+    """ An extra button is released """
+    EXTRA_CLICK_RELEASE: str = "128m"
+
+    """ A button is released, but the terminal doesn't say which one (X10/urxvt reports) """
+    BUTTON_RELEASE: str = "3m"
+
+
+# mouse code bits
+SHIFT: int = 4
+META: int = 8
+CTRL: int = 16
+MOTION: int = 32
+WHEEL: int = 64
+EXTRA: int = 128
+
+
+class MouseInput:
+    """
+    A decoded mouse event
+    button is 1 (left), 2 (middle), 3 (right), 4-7 (wheel up/down/left/right), 8-11 (extra) or 0 (none/unknown)
+    row and column are 1 based terminal coordinates
+    """
+
+    __slots__ = ('event', 'button', 'shift', 'meta', 'ctrl', 'motion', 'wheel', 'row', 'column')
+
+    def __init__(self, event: MouseEvent, button: int, shift: bool, meta: bool, ctrl: bool, motion: bool, wheel: bool, row: int = -1, column: int = -1) -> None:
+        self.event: MouseEvent = event
+        self.button: int = button
+        self.shift: bool = shift
+        self.meta: bool = meta
+        self.ctrl: bool = ctrl
+        self.motion: bool = motion
+        self.wheel: bool = wheel
+        self.row: int = row
+        self.column: int = column
+
+
+def _decode(code: int, pressed: bool) -> tuple:
+    """
+    Decode a mouse button code (as in SGR reports) and press flag
+    Returns the arguments of MouseInput without the coordinates, None if the code means nothing to us
+    """
+
+    low: int = code & 3
+    high: int = code & (WHEEL | EXTRA)
+    motion: bool = bool(code & MOTION)
+    modifiers: tuple[bool, bool, bool] = (bool(code & SHIFT), bool(code & META), bool(code & CTRL))
+
+    if high == 0:
+        if low == 3:
+            # no button - plain motion or a release which doesn't say which button
+            event: MouseEvent = MouseEvent.POINTER_MOVE if motion else MouseEvent.BUTTON_RELEASE
+            return (event, 0, *modifiers, motion, False)
+
+        # button codes are ordered left, middle, right
+        hold, drag, release = (
+            (MouseEvent.LEFT_CLICK_HOLD, MouseEvent.LEFT_CLICK_DRAG, MouseEvent.LEFT_CLICK_RELEASE),
+            (MouseEvent.MIDDLE_CLICK_HOLD, MouseEvent.MIDDLE_CLICK_DRAG, MouseEvent.MIDDLE_CLICK_RELEASE),
+            (MouseEvent.RIGHT_CLICK_HOLD, MouseEvent.RIGHT_CLICK_DRAG, MouseEvent.RIGHT_CLICK_RELEASE),
+        )[low]
+        button: int = (1, 2, 3)[low]
+
+    elif high == WHEEL:
+        if not pressed:
+            return None  # wheels don't really release
+
+        event = (MouseEvent.SCROLL_UP, MouseEvent.SCROLL_DOWN, MouseEvent.SCROLL_LEFT, MouseEvent.SCROLL_RIGHT)[low]
+        return (event, 4 + low, *modifiers, motion, True)
+
+    elif high == EXTRA:
+        hold, drag, release = MouseEvent.EXTRA_CLICK_HOLD, MouseEvent.EXTRA_CLICK_DRAG, MouseEvent.EXTRA_CLICK_RELEASE
+        button = 8 + low
+
+    else:
+        return None
+
+    if motion:
+        return (drag, button, *modifiers, True, False)
+
+    return (hold if pressed else release, button, *modifiers, False, False)
+
+
+# decoding of every possible button code, indexed by code << 1 | pressed
+DECODE_TABLE: list[tuple] = [_decode(index >> 1, bool(index & 1)) for index in range(512)]
+
 
 class Mouse:
     """ Class that manages mouse position in character, last mouse event, and subscriptions """
@@ -112,40 +330,43 @@ class Mouse:
         self.row: int = -1
         self.column: int = -1
         self.last_event: MouseEvent = None
+        self.last_input: MouseInput = None
+
+        # reports with a code that isn't in the decode table
+        self.unknown: int = 0
 
         self.subscriptions: dict[MouseEvent, set[Callable[..., Any]]] = {}
 
-    def update(self, input_: list[str]):
+    def update(self, report: MouseReport):
         """
-        input_ should be passed by Input.read_input
-        and should contain [code, row, column, M/m]
-        M - action, m - release event
-        updates mouse position and last event
+        report should be passed by Input.read_input
+        decodes it with a lookup in DECODE_TABLE (modifiers, motion, wheel, extra buttons included)
+        updates mouse position, last event and last input
         updating last event will trigger callback functions if one is set
         """
 
-        code = f"{input_[0]}{input_[-1]}"  # get mouse input code example: 35M
-        self.row = input_[2]  # update mouse row pos
-        self.column = input_[1]  # update mouse column pos
-        self.last_event = self.get_event(code)
-        print(f"Row {self.row}  Column {self.column}  {MouseEvent(code).name}")
+        start: float = profiler.start()
 
-        # call all functions, subscribed to the event
-        try:
-            for callback in self.subscriptions[self.last_event]:
-                callback()
-        except KeyError: 
-            pass  # event has never had any subscribtions
+        code: int = report.code
+        decoded: tuple = DECODE_TABLE[code << 1 | report.pressed] if 0 <= code < 256 else None
 
-    def get_event(self, code: str) -> MouseEvent:
-        """
-        Given a mouse input event code, convert it to the representing event
-        """
+        if decoded is None:
+            self.unknown += 1
+            return
 
-        try:
-            return MouseEvent(code).name
-        except Exception as e:
-            prZZint(e)
+        self.row = report.row  # update mouse row pos
+        self.column = report.column  # update mouse column pos
+        self.last_input = MouseInput(*decoded, report.row, report.column)
+        self.last_event = decoded[0]
+
+        # call all functions, subscribed to the event
+        callbacks = self.subscriptions.get(self.last_event)
+        if callbacks:
+            for callback in callbacks:
+                invoke(callback)
+
+        if start:
+            profiler.record('mouse', start)
 
     def subscribe(self, event: MouseEvent, callback: Callable[..., Any]):
         """ Subscribe a function to an event. Duplicate callbacks cannot be added (no effect) """
@@ -168,27 +389,61 @@ class Mouse:
 
 
 class Keyboard:
-    """ TODO: HOTKEYS """
+    """
+    Class that manages key presses and their subscriptions
+    subscribe reacts to a single key, bind to key sequences/hotkeys (see keybindings.KeyBindings)
+    """
 
-    def __init__(self):
+    def __init__(self, chord_timeout: float = 1.0):
         self.last_press: str = ''
         self.subscriptions: dict[str, set[Callable[..., Any]]] = {}
+        self.paste_listeners: set[Callable[[str], Any]] = set()
+        self.bindings: KeyBindings = KeyBindings(chord_timeout)
 
     def update(self, input_: str):
         """
         input_ should be passed by Input.read_input
-        should always be 1 character long
-        TODO: hotkey support
+        is a single character or the name of a special key (see input_parser.KeyEvent)
+        calls single key subscriptions and advances key bindings
         """
 
+        start: float = profiler.start()
+
         self.last_press = input_
-        print(self.last_press)
 
-        try:
-            for callback in self.subscriptions[self.last_press]:
-                callback()
-        except KeyError: 
-            pass  # event has never had any subscribtions
+        callbacks = self.subscriptions.get(input_)
+        if callbacks:
+            for callback in callbacks:
+                invoke(callback)
+
+        self.bindings.feed(input_, monotonic())
+
+        if start:
+            profiler.record('keyboard', start)
+
+    def bind(self, keys: str, callback: Callable[..., Any]) -> None:
+        """
+        Bind a function to a key sequence, for example 'q', 'g g', 'Ctrl-x Ctrl-s', 'alt+x', 'ctrl+up', 'f5'
+        Duplicate callbacks cannot be added (no effect)
+        """
+
+        self.bindings.bind(keys, callback)
+
+    def unbind(self, keys: str, callback: Callable[..., Any]) -> None:
+        """ Remove a key binding, raise an error if it doesn't exist """
+
+        self.bindings.unbind(keys, callback)
+
+    def paste(self, text: str) -> None:
+        """ Call paste listeners with pasted text (bracketed paste) """
+
+        for callback in self.paste_listeners:
+            invoke(callback, text)
+
+    def on_paste(self, callback: Callable[[str], Any]) -> None:
+        """ Subscribe a function to pasted text, it's called with the text """
+
+        self.paste_listeners.add(callback)
 
     def subscribe(self, event: str, callback: Callable[..., Any]):
         """ Subscribe a function to a keyboard button press. Duplicate callbacks cannot be added (no effect) """
@@ -0,0 +1,419 @@
+ESC: int = 0x1b
+
+# CSI final byte -> key name, for sequences like \x1b[A or \x1b[1;5A
+CSI_KEYS: dict[int, str] = {
+    ord('A'): 'up',
+    ord('B'): 'down',
+    ord('C'): 'right',
+    ord('D'): 'left',
+    ord('H'): 'home',
+    ord('F'): 'end',
+    ord('Z'): 'shift+tab',
+    ord('P'): 'f1',
+    ord('Q'): 'f2',
+    ord('R'): 'f3',
+    ord('S'): 'f4',
+}
+
+# number of \x1b[<number>~ sequences -> key name
+TILDE_KEYS: dict[int, str] = {
+    1: 'home', 2: 'insert', 3: 'delete', 4: 'end', 5: 'pageup', 6: 'pagedown', 7: 'home', 8: 'end',
+    11: 'f1', 12: 'f2', 13: 'f3', 14: 'f4', 15: 'f5', 17: 'f6', 18: 'f7', 19: 'f8', 20: 'f9', 21: 'f10',
+    23: 'f11', 24: 'f12',
+}
+
+# SS3 (\x1bO<final>) final byte -> key name
+SS3_KEYS: dict[int, str] = CSI_KEYS
+
+PASTE_START: int = 200
+PASTE_END: bytes = b'\x1b[201~'
+
+
+class KeyEvent:
+    """
+    A key press
+    key is the character typed ('a', '\\x18' for ctrl+x, ...) or the name of a special key
+    ('up', 'f5', 'escape', ...) with modifiers as a prefix ('ctrl+up', 'alt+x')
+    """
+
+    __slots__ = ('key',)
+
+    def __init__(self, key: str) -> None:
+        self.key: str = key
+
+    def __repr__(self) -> str:
+        return f"KeyEvent({self.key!r})"
+
+
+class MouseReport:
+    """
+    A mouse report as sent by the terminal
+    code is the button code as in SGR (1006) reports (X10/urxvt codes are converted to it)
+    pressed is False for a release
+    """
+
+    __slots__ = ('code', 'column', 'row', 'pressed')
+
+    def __init__(self, code: int, column: int, row: int, pressed: bool) -> None:
+        self.code: int = code
+        self.column: int = column
+        self.row: int = row
+        self.pressed: bool = pressed
+
+    def __repr__(self) -> str:
+        return f"MouseReport({self.code}, {self.column}, {self.row}, {self.pressed})"
+
+
+class PasteEvent:
+    """ Text pasted while bracketed paste mode is on """
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+
+    def __repr__(self) -> str:
+        return f"PasteEvent({self.text!r})"
+
+
+class InputParser:
+    """
+    Incremental tokenizer turning the raw bytes read from stdin into events
+    Bytes can be fed in chunks of any size - an event split over 2 reads is completed by the next feed
+    and every complete event of a read is returned (several mouse reports can come in one read)
+
+    Understands:
+    - SGR (1006) mouse reports \\x1b[<b;x;yM, urxvt (1015) \\x1b[b;x;yM and X10 \\x1b[Mbxy
+    - CSI and SS3 key sequences (arrows, function keys, with modifiers)
+    - bracketed paste \\x1b[200~ ... \\x1b[201~
+    - UTF-8 characters, alt+key as ESC followed by the key
+    Parsing is a single pass over the buffer without backtracking
+    """
+
+    def __init__(self) -> None:
+        self.buffer: bytearray = bytearray()
+        self.in_paste: bool = False
+
+    @property
+    def pending(self) -> bool:
+        """ Whether there are bytes of an incomplete event waiting for more input """
+
+        return bool(self.buffer)
+
+    def feed(self, data: bytes) -> list:
+        """ Add bytes read from the terminal, return all events completed by them """
+
+        self.buffer += data
+        return self._parse()
+
+    def flush(self) -> list:
+        """
+        Treat whatever is pending as complete
+        Use when no more bytes came for a while - a lone ESC is then the escape key and not a sequence start
+        """
+
+        events: list = self._parse()
+
+        if self.in_paste:
+            events.append(PasteEvent(self.buffer.decode(errors='replace')))
+            self.in_paste = False
+        elif self.buffer:
+            if self.buffer[0] == ESC:
+                # an escape key press, possibly followed by the start of something incomplete
+                events.append(KeyEvent('escape'))
+                rest: bytes = bytes(self.buffer[1:])
+                self.buffer.clear()
+                return events + self.feed(rest) + (self.flush() if self.buffer else [])
+
+            events.extend(KeyEvent(char) for char in self.buffer.decode(errors='replace'))
+
+        self.buffer.clear()
+        return events
+
+    def _parse(self) -> list:
+        """ Parse as many complete events from the buffer as possible, keep the rest """
+
+        buffer: bytearray = self.buffer
+        length: int = len(buffer)
+        events: list = []
+        position: int = 0
+
+        while position < length:
+            if self.in_paste:
+                end: int = buffer.find(PASTE_END, position)
+                if end == -1:
+                    break  # wait for the rest of the paste
+
+                events.append(PasteEvent(buffer[position:end].decode(errors='replace')))
+                self.in_paste = False
+                position = end + len(PASTE_END)
+                continue
+
+            byte: int = buffer[position]
+
+            if byte == ESC:
+                consumed: int = self._parse_escape(buffer, position, length, events)
+            elif byte < 0x80:
+                events.append(KeyEvent(chr(byte)))
+                consumed = 1
+            else:
+                consumed = self._parse_utf8(buffer, position, length, events)
+
+            if consumed == 0:
+                break  # incomplete, wait for more bytes
+
+            position += consumed
+
+        del buffer[:position]
+        return events
+
+    def _parse_utf8(self, buffer: bytearray, position: int, length: int, events: list, prefix: str = '') -> int:
+        """ Parse one UTF-8 character, return the amount of bytes used (0 if incomplete) """
+
+        byte: int = buffer[position]
+
+        if 0xc0 <= byte < 0xe0:
+            size: int = 2
+        elif 0xe0 <= byte < 0xf0:
+            size = 3
+        elif 0xf0 <= byte < 0xf8:
+            size = 4
+        else:
+            events.append(KeyEvent(prefix + '�'))  # not a valid lead byte
+            return 1
+
+        # every byte after the lead byte must be a continuation byte, otherwise it starts the next key
+        for index in range(position + 1, min(position + size, length)):
+            if not 0x80 <= buffer[index] < 0xc0:
+                events.append(KeyEvent(prefix + '�'))
+                return 1
+
+        if position + size > length:
+            return 0
+
+        events.append(KeyEvent(prefix + buffer[position:position + size].decode(errors='replace')))
+        return size
+
+    def _parse_escape(self, buffer: bytearray, position: int, length: int, events: list) -> int:
+        """ Parse an event starting with ESC, return the amount of bytes used (0 if incomplete) """
+
+        if position + 1 >= length:
+            return 0  # lone ESC - either the escape key or the start of a sequence (see flush)
+
+        second: int = buffer[position + 1]
+
+        if second == ord('['):
+            return self._parse_csi(buffer, position, length, events)
+
+        if second == ord('O'):
+            if position + 2 >= length:
+                return 0
+
+            events.append(KeyEvent(SS3_KEYS.get(buffer[position + 2], buffer[position:position + 3].decode(errors='replace'))))
+            return 3
+
+        if second == ESC:
+            events.append(KeyEvent('escape'))
+            return 1
+
+        # ESC followed by a key - alt+key
+        if second < 0x80:
+            events.append(KeyEvent('alt+' + chr(second)))
+            return 2
+
+        consumed: int = self._parse_utf8(buffer, position + 1, length, events, 'alt+')
+        return consumed + 1 if consumed else 0
+
+    def _parse_csi(self, buffer: bytearray, position: int, length: int, events: list) -> int:
+        """ Parse a CSI (ESC [) sequence, return the amount of bytes used (0 if incomplete) """
+
+        start: int = position + 2
+
+        if start >= length:
+            return 0
+
+        # X10 mouse: ESC [ M followed by 3 bytes - button, column and row, all +32
+        if buffer[start] == ord('M'):
+            if start + 3 >= length:
+                return 0
+
+            self._add_mouse(events, buffer[start + 1] - 32, buffer[start + 2] - 32, buffer[start + 3] - 32, None)
+            return 6
+
+        # parameter bytes, then intermediate bytes, then a final byte
+        end: int = start
+        while end < length and 0x20 <= buffer[end] <= 0x3f:
+            end += 1
+
+        if end >= length:
+            return 0
+
+        final: int = buffer[end]
+        consumed: int = end + 1 - position
+
+        if not 0x40 <= final <= 0x7e:
+            # broken sequence, give the escape key and let the rest be parsed as keys
+            events.append(KeyEvent('escape'))
+            return 1
+
+        parameters: bytes = bytes(buffer[start:end])
+
+        # SGR mouse: ESC [ < b ; x ; y M/m
+        if parameters[:1] == b'<' and final in (ord('M'), ord('m')):
+            numbers: list[int] = self._numbers(parameters[1:])
+            if len(numbers) == 3:
+                self._add_mouse(events, numbers[0], numbers[1], numbers[2], final == ord('M'))
+                return consumed
+
+        numbers = self._numbers(parameters)
+
+        # urxvt mouse: ESC [ b ; x ; y M with b +32
+        if final == ord('M') and len(numbers) == 3:
+            self._add_mouse(events, numbers[0] - 32, numbers[1], numbers[2], None)
+            return consumed
+
+        if final == ord('~') and numbers:
+            if numbers[0] == PASTE_START:
+                self.in_paste = True
+                return consumed
+
+            key: str = TILDE_KEYS.get(numbers[0])
+        else:
+            key = CSI_KEYS.get(final)
+
+        if key is None:
+            # unknown sequence, pass it on as it is
+            events.append(KeyEvent(buffer[position:end + 1].decode(errors='replace')))
+            return consumed
+
+        # second number is 1 + modifier bits (shift 1, alt 2, ctrl 4)
+        if len(numbers) > 1 and numbers[1] > 1:
+            modifiers: int = numbers[1] - 1
+            key = ('ctrl+' if modifiers & 4 else '') + ('alt+' if modifiers & 2 else '') + ('shift+' if modifiers & 1 else '') + key
+
+        events.append(KeyEvent(key))
+        return consumed
+
+    @staticmethod
+    def _numbers(parameters: bytes) -> list[int]:
+        """ Split ; separated parameters into numbers (empty ones are 0, invalid ones make the list empty) """
+
+        try:
+            return [int(number) if number else 0 for number in parameters.split(b';')]
+        except ValueError:
+            return []
+
+    @staticmethod
+    def _add_mouse(events: list, code: int, column: int, row: int, pressed: bool) -> None:
+        """
+        Add a mouse report
+        pressed is None for X10/urxvt reports, which mark any release with button bits 3 (no motion)
+        """
+
+        if pressed is None:
+            pressed = code & 3 != 3 or bool(code & 32)
+
+        events.append(MouseReport(code, column, row, pressed))
+
+
+class MotionCoalescer:
+    """
+    Stage between parsing and dispatching which collapses floods of mouse motion (mode 1003)
+    A run of consecutive motion reports with the same code becomes its most recent report
+    Presses, releases, scrolls and keys are never dropped and keep their order
+
+    Policies:
+    - NONE: every event is passed on
+    - LATEST: a run of motion within one batch (one read) is collapsed to its last report
+    - RATE: like LATEST, and motion is passed on at most once per interval seconds
+            held back motion is passed on by flush, or before the next non-motion event
+    """
+
+    NONE: str = 'none'
+    LATEST: str = 'latest'
+    RATE: str = 'rate'
+
+    def __init__(self, policy: str = LATEST, interval: float = 1 / 60) -> None:
+        if policy not in (self.NONE, self.LATEST, self.RATE):
+            raise ValueError(f"Unknown coalescing policy: {policy}")
+
+        self.policy: str = policy
+        self.interval: float = interval
+
+        self.held: MouseReport = None  # motion held back by the RATE policy
+        self.last_motion: float = float('-inf')  # when motion was last passed on
+
+        # counters
+        self.passed: int = 0
+        self.dropped: int = 0
+
+    @staticmethod
+    def is_motion(event: object) -> bool:
+        """ Motion reports have the motion bit (32) set """
+
+        return isinstance(event, MouseReport) and bool(event.code & 32) and event.pressed
+
+    def coalesce(self, events: list, now: float) -> list:
+        """ Return the events of a batch which should be dispatched """
+
+        if self.policy == self.NONE:
+            self.passed += len(events)
+            return events
+
+        result: list = []
+        held: MouseReport = self.held
+
+        for event in events:
+            if self.is_motion(event):
+                if held is not None:
+                    if held.code == event.code:
+                        self.dropped += 1  # replaced by the newer position
+                    else:
+                        result.append(held)  # different buttons held, keep the transition
+                held = event
+                continue
+
+            if held is not None:
+                result.append(held)
+                held = None
+
+            result.append(event)
+
+        # the last motion of the batch, RATE may hold it back for later
+        if held is not None:
+            if self.policy == self.RATE and now - self.last_motion < self.interval and not result:
+                self.held = held
+                return result
+
+            result.append(held)
+
+        self.held = None
+        self._count(result, now)
+
+        return result
+
+    def timeout(self, now: float) -> float:
+        """ Seconds until held back motion should be flushed, None if nothing is held """
+
+        if self.held is None:
+            return None
+
+        return max(0, self.last_motion + self.interval - now)
+
+    def flush(self, now: float) -> list:
+        """ Return held back motion if its time has come """
+
+        if self.held is None or now - self.last_motion < self.interval:
+            return []
+
+        result: list = [self.held]
+        self.held = None
+        self._count(result, now)
+
+        return result
+
+    def _count(self, events: list, now: float) -> None:
+        self.passed += len(events)
+
+        if any(self.is_motion(event) for event in events):
+            self.last_motion = now
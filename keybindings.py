@@ -0,0 +1,214 @@
+from typing import Any, Callable
+
+from callbacks import invoke
+
+
+# other names of keys, as used in binding specs -> key as produced by the input parser
+KEY_ALIASES: dict[str, str] = {
+    'esc': 'escape',
+    'enter': '\r',
+    'return': '\r',
+    'tab': '\t',
+    'space': ' ',
+    'backspace': '\x7f',
+    'del': 'delete',
+    'ins': 'insert',
+    'pgup': 'pageup',
+    'pgdn': 'pagedown',
+}
+
+# (modifier, key) combinations the terminal sends as a key of their own -> key as produced by the input parser
+# checked before aliases, 'shift+tab' isn't a shifted '\t' and ctrl+space is NUL, not a control space
+MODIFIED_KEYS: dict[tuple[str, str], str] = {
+    ('shift', 'tab'): 'shift+tab',
+    ('ctrl', 'space'): '\x00',
+    ('ctrl', ' '): '\x00',
+}
+
+# modifier prefixes in binding specs -> modifier
+MODIFIERS: dict[str, str] = {
+    'ctrl': 'ctrl', 'control': 'ctrl', 'c': 'ctrl',
+    'alt': 'alt', 'meta': 'alt', 'm': 'alt',
+    'shift': 'shift', 's': 'shift',
+}
+
+
+def parse_key(spec: str) -> str:
+    """
+    Convert a single key of a binding spec to the key produced by the input parser
+    Modifiers are separated with + or - and are case insensitive: 'Ctrl-x' -> '\\x18', 'alt+x' -> 'alt+x', 'C-Up' -> 'ctrl+up'
+    A modifier the terminal can't send with the key ('ctrl+1', 'shift+-') raises ValueError instead of being dropped
+    """
+
+    modifiers: set[str] = set()
+
+    # peel off modifiers, the last part is always the key itself (so 'ctrl+-' works)
+    while len(spec) > 1:
+        for separator in '+-':
+            prefix, found, rest = spec.partition(separator)
+            if found and rest and prefix.lower() in MODIFIERS:
+                modifiers.add(MODIFIERS[prefix.lower()])
+                spec = rest
+                break
+        else:
+            break
+
+    key: str = spec if len(spec) == 1 else spec.lower()
+
+    for modifier in list(modifiers):
+        if (modifier, key) in MODIFIED_KEYS:
+            key = MODIFIED_KEYS[modifier, key]
+            modifiers.discard(modifier)
+            break
+
+    key = KEY_ALIASES.get(key, key)
+
+    if len(key) == 1:
+        if 'shift' in modifiers:
+            if not key.isalpha():
+                raise ValueError(f"Shift can't be combined with {key!r}, bind the shifted character instead")
+
+            key = key.upper()
+            modifiers.discard('shift')
+
+        # control characters, ctrl+x is \x18
+        if 'ctrl' in modifiers:
+            if not (key.isascii() and key.isalpha() or key in '@[\\]^_'):
+                raise ValueError(f"Ctrl can't be combined with {key!r}, terminals send no key for it")
+
+            key = chr(ord(key.upper()) & 0x1f)
+            modifiers.discard('ctrl')
+
+        # alt is sent as ESC before the key, the parser calls it alt+key
+        return ('alt+' if 'alt' in modifiers else '') + key
+
+    # special keys - same modifier order as the parser
+    return ''.join(f"{modifier}+" for modifier in ('ctrl', 'alt', 'shift') if modifier in modifiers) + key
+
+
+def parse_keys(spec: str) -> tuple[str, ...]:
+    """ Convert a binding spec of space separated keys ('g g', 'Ctrl-x Ctrl-s') into a key sequence """
+
+    keys: tuple[str, ...] = tuple(parse_key(key) for key in spec.split())
+
+    if not keys:
+        raise ValueError("Empty key binding")
+
+    return keys
+
+
+class TrieNode:
+    """ Node of the key binding trie - callbacks bound to the key sequence leading here, and the keys that continue it """
+
+    __slots__ = ('children', 'callbacks')
+
+    def __init__(self) -> None:
+        self.children: dict[str, TrieNode] = {}
+        self.callbacks: set[Callable[..., Any]] = set()
+
+
+class KeyBindings:
+    """
+    Key binding engine - a prefix trie of key sequences
+    Every key press moves one step down the trie (one dict lookup), so resolving a binding
+    costs O(length of the sequence) no matter how many bindings exist
+
+    When a sequence is complete and nothing longer starts with it, its callbacks are called right away
+    When it is also the start of longer bindings ('g' and 'g g'), it waits chord_timeout seconds for the next key
+    A key which doesn't continue the pending sequence ends it - a bound pending sequence fires and the key starts over
+    """
+
+    def __init__(self, chord_timeout: float = 1.0) -> None:
+        self.root: TrieNode = TrieNode()
+        self.chord_timeout: float = chord_timeout
+
+        self.current: TrieNode = self.root  # position of the pending sequence
+        self.deadline: float = None  # when the pending sequence times out
+
+    def bind(self, spec: str, callback: Callable[..., Any]) -> None:
+        """ Bind a callback to a key sequence spec ('q', 'g g', 'Ctrl-x Ctrl-s', 'alt+up', 'f5') """
+
+        node: TrieNode = self.root
+        for key in parse_keys(spec):
+            node = node.children.setdefault(key, TrieNode())
+
+        node.callbacks.add(callback)
+
+    def unbind(self, spec: str, callback: Callable[..., Any]) -> None:
+        """
+        Remove a binding, empty branches are pruned
+        Raise an error if the binding doesn't exist
+        """
+
+        path: list[tuple[TrieNode, str]] = []
+        node: TrieNode = self.root
+
+        try:
+            for key in parse_keys(spec):
+                path.append((node, key))
+                node = node.children[key]
+
+            node.callbacks.remove(callback)
+        except KeyError:
+            raise Exception("Binding doesn't exist.")
+
+        # prune nodes which don't lead to any binding anymore
+        for parent, key in reversed(path):
+            child: TrieNode = parent.children[key]
+            if child.callbacks or child.children:
+                break
+            del parent.children[key]
+
+        self.reset()
+
+    def reset(self) -> None:
+        """ Drop the pending sequence """
+
+        self.current = self.root
+        self.deadline = None
+
+    def feed(self, key: str, now: float) -> bool:
+        """ Advance by a key press, return whether the key was part of a binding """
+
+        node: TrieNode = self.current.children.get(key)
+
+        if node is None:
+            if self.current is self.root:
+                return False  # not bound
+
+            # the pending sequence is broken, it fires if it's bound itself, then the key starts over
+            pending: TrieNode = self.current
+            self.reset()
+            self._fire(pending)
+            return self.feed(key, now)
+
+        if node.children:
+            # a longer binding may follow, wait for the next key
+            self.current = node
+            self.deadline = now + self.chord_timeout
+            return True
+
+        self.reset()
+        self._fire(node)
+        return True
+
+    def timeout(self, now: float) -> float:
+        """ Seconds until the pending sequence times out, None if there's none """
+
+        if self.deadline is None:
+            return None
+
+        return max(0, self.deadline - now)
+
+    def expire(self, now: float) -> None:
+        """ Resolve the pending sequence if it timed out - it fires if it's bound itself """
+
+        if self.deadline is not None and now >= self.deadline:
+            node: TrieNode = self.current
+            self.reset()
+            self._fire(node)
+
+    @staticmethod
+    def _fire(node: TrieNode) -> None:
+        for callback in list(node.callbacks):
+            invoke(callback)
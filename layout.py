@@ -0,0 +1,202 @@
+from frame import Frame
+
+
+# a rectangle on screen - (top, left, rows, columns), top and left are 0 based
+Rect = tuple[int, int, int, int]
+
+
+class LayoutNode:
+    """
+    Base node of the layout tree used by the frame manager
+    Every node remembers the rectangle it was last laid out in
+    A node is only laid out again if its rectangle changes or it was invalidated
+    """
+
+    def __init__(self) -> None:
+        self.parent: SplitNode = None
+        self.rect: Rect = None  # rectangle of the last layout
+        self.dirty: bool = True  # True if the node has to be laid out even if its rectangle is unchanged
+
+    def invalidate(self) -> None:
+        """ Force the node and all of its ancestors to be laid out on the next layout """
+
+        node: LayoutNode = self
+        while node is not None:
+            node.dirty = True
+            node.clear_min_size()
+            node = node.parent
+
+    def clear_min_size(self) -> None:
+        """ Forget cached minimum sizes """
+
+        pass
+
+    def min_size(self) -> tuple[int, int]:
+        """ Return the minimum (rows, columns) the node can be laid out in """
+
+        raise NotImplementedError
+
+    def layout(self, rect: Rect) -> None:
+        """ Lay the node out in rect, skipped if nothing changed since the last layout """
+
+        if rect == self.rect and not self.dirty:
+            return
+
+        self.rect = rect
+        self.dirty = False
+        self._layout(rect)
+
+    def _layout(self, rect: Rect) -> None:
+        raise NotImplementedError
+
+    def frames(self) -> list[Frame]:
+        """ Return all frames in the subtree, in layout order """
+
+        raise NotImplementedError
+
+
+class FrameNode(LayoutNode):
+    """ Leaf of the layout tree holding a single frame """
+
+    def __init__(self, frame: Frame, min_rows: int = 1, min_columns: int = 1) -> None:
+        super().__init__()
+
+        self.frame: Frame = frame
+        self.min_rows: int = min_rows
+        self.min_columns: int = min_columns
+
+        # the frame was already placed when it was created
+        self.rect = (frame.top_left_point[0] - 1, frame.top_left_point[1] - 1, frame.rows, frame.columns)
+
+    def min_size(self) -> tuple[int, int]:
+        return self.min_rows, self.min_columns
+
+    def _layout(self, rect: Rect) -> None:
+        top, left, rows, columns = rect
+
+        # +1 because the first character in the terminal is (1, 1)
+        if (rows, columns, (top + 1, left + 1)) != (self.frame.rows, self.frame.columns, self.frame.top_left_point):
+            self.frame.resize(rows, columns, (top + 1, left + 1))
+
+    def frames(self) -> list[Frame]:
+        return [self.frame]
+
+
+class SplitNode(LayoutNode):
+    """
+    Node dividing its rectangle between 2 or more children
+    VERTICAL places the children next to each other " x|y ", HORIZONTAL places them on top of each other
+    Every child gets a share of the space given by its ratio, but never less than its minimum size
+    """
+
+    VERTICAL: str = 'v'
+    HORIZONTAL: str = 'h'
+
+    def __init__(self, orientation: str, children: list[LayoutNode], ratios: list[float] = None) -> None:
+        super().__init__()
+
+        if orientation not in (self.VERTICAL, self.HORIZONTAL):
+            raise ValueError(f"Unknown split orientation: {orientation}")
+
+        self.orientation: str = orientation
+        self.children: list[LayoutNode] = children
+        self.ratios: list[float] = [1] * len(children) if ratios is None else list(ratios)
+
+        if len(self.ratios) != len(children):
+            raise ValueError("Every child needs exactly one ratio")
+
+        for child in children:
+            child.parent = self
+
+        self._min_size: tuple[int, int] = None
+
+    def set_ratios(self, ratios: list[float]) -> None:
+        """ Change the ratios of the children, the split is laid out again on the next layout """
+
+        if len(ratios) != len(self.children):
+            raise ValueError("Every child needs exactly one ratio")
+
+        self.ratios = list(ratios)
+        self.invalidate()
+
+    def replace(self, old: LayoutNode, new: LayoutNode) -> None:
+        """ Replace a child node, keeping its ratio """
+
+        self.children[self.children.index(old)] = new
+        new.parent = self
+        self.invalidate()
+
+    def clear_min_size(self) -> None:
+        self._min_size = None
+
+    def min_size(self) -> tuple[int, int]:
+        """ Children minimums add up along the split and the largest one counts across it (cached) """
+
+        if self._min_size is None:
+            sizes: list[tuple[int, int]] = [child.min_size() for child in self.children]
+
+            if self.orientation == self.VERTICAL:
+                self._min_size = (max(rows for rows, columns in sizes), sum(columns for rows, columns in sizes))
+            else:
+                self._min_size = (sum(rows for rows, columns in sizes), max(columns for rows, columns in sizes))
+
+        return self._min_size
+
+    def sizes(self, total: int) -> list[int]:
+        """ Divide total between the children according to their ratios and minimum sizes """
+
+        axis: int = 1 if self.orientation == self.VERTICAL else 0
+        minimums: list[int] = [child.min_size()[axis] for child in self.children]
+
+        # not enough space for all minimums, hand out space in order
+        if sum(minimums) >= total:
+            sizes: list[int] = []
+            for minimum in minimums:
+                sizes.append(min(minimum, total))
+                total -= sizes[-1]
+            return sizes
+
+        # children which would get less than their minimum are fixed to it and the rest is divided again
+        fixed: dict[int, int] = {}
+        while True:
+            free: list[int] = [index for index in range(len(self.children)) if index not in fixed]
+            free_total: int = total - sum(fixed.values())
+            ratio_total: float = sum(self.ratios[index] for index in free)
+
+            # cumulative rounding, so the sizes always add up to the total
+            # for 2 equal children the first one gets the floor and the second the ceil of half
+            shares: dict[int, int] = {}
+            edge: int = 0
+            cumulative: float = 0
+            for index in free:
+                cumulative += self.ratios[index]
+                new_edge: int = int(free_total * cumulative / ratio_total) if ratio_total else free_total
+                if index == free[-1]:
+                    new_edge = free_total  # don't lose a cell to float rounding
+                shares[index] = new_edge - edge
+                edge = new_edge
+
+            too_small: list[int] = [index for index in free if shares[index] < minimums[index]]
+            if not too_small:
+                break
+
+            for index in too_small:
+                fixed[index] = minimums[index]
+
+        shares.update(fixed)
+        return [shares[index] for index in range(len(self.children))]
+
+    def _layout(self, rect: Rect) -> None:
+        top, left, rows, columns = rect
+
+        if self.orientation == self.VERTICAL:
+            for child, size in zip(self.children, self.sizes(columns)):
+                child.layout((top, left, rows, size))
+                left += size
+        else:
+            for child, size in zip(self.children, self.sizes(rows)):
+                child.layout((top, left, size, columns))
+                top += size
+
+    def frames(self) -> list[Frame]:
+        return [frame for child in self.children for frame in child.frames()]
@@ -0,0 +1,401 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from itertools import count
+from threading import Lock, local
+from time import perf_counter
+from typing import Any, Callable, Hashable, Iterator
+
+from cell_buffer import CellBuffer
+from focalboard import Block, Database
+from unicode_width import fit_text
+from widget import ListWidget
+
+
+class Job:
+    """ Handle of work submitted to a Pipeline, cancel it when its result isn't needed anymore """
+
+    __slots__ = ('key', 'generation', 'load', 'apply', 'args', 'cancelled')
+
+    def __init__(self, key: Hashable, generation: int, load: Callable[..., Any], apply: Callable[[Any], Any], args: tuple) -> None:
+        self.key: Hashable = key
+        self.generation: int = generation
+        self.load: Callable[..., Any] = load
+        self.apply: Callable[[Any], Any] = apply
+        self.args: tuple = args
+        self.cancelled: bool = False
+
+    def cancel(self) -> None:
+        """ Don't start the job if it hasn't started yet and drop its result """
+
+        self.cancelled = True
+
+
+class Pipeline:
+    """
+    Loads and renders content on a pool of worker threads, so queries, JSON parsing and text layout
+    don't hold up input handling and painting
+
+    submit(key, load, apply) runs load on a worker and then apply with its result on the UI thread -
+    load does the slow part (for example query a page of cards and render it into a CellBuffer),
+    apply only hands the result over (copies rows into a widget)
+
+    - cancellation - a job is superseded by a newer one with the same key and can be cancelled,
+      cancelled jobs don't start and their results are dropped
+    - backpressure - at most workers jobs are running or waiting to be applied, the others wait in a queue
+      of at most max_queued jobs, newest first (what the user scrolled to last); the oldest are dropped
+    - bounded latency - results are applied by drain, at most budget seconds at a time, the rest on the next
+      drain, so a large board arriving at once doesn't delay the next input or frame
+
+    With an event loop, drain is called on the loop's thread whenever results arrive, followed by a render
+    Without one call drain yourself
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 32, budget: float = 0.004, event_loop: 'EventLoop' = None) -> None:
+        self.workers: int = workers
+        self.max_queued: int = max_queued
+        self.budget: float = budget
+        self.event_loop: 'EventLoop' = event_loop
+
+        self.executor: 'ThreadPoolExecutor' = None  # created with the first job
+
+        self.generations: dict[Hashable, int] = {}  # generation of the latest job of every key not applied yet
+        self._generations: count = count()
+        self.queued: deque[Job] = deque()
+        self.in_flight: int = 0  # jobs running or finished but not applied
+
+        # (job, result, error) of finished jobs, appended by the workers
+        self.done: deque[tuple[Job, Any, Exception]] = deque()
+
+        self._lock: Lock = Lock()
+        self._wake_scheduled: bool = False
+        self._batching: bool = False
+
+    def submit(self, key: Hashable, load: Callable[..., Any], apply: Callable[[Any], Any], *args: Any) -> Job:
+        """ Run load(*args) on a worker and apply(result) on the UI thread, superseding earlier jobs of key """
+
+        generation: int = next(self._generations)
+        self.generations[key] = generation
+
+        job: Job = Job(key, generation, load, apply, args)
+        self.queued.append(job)
+
+        while len(self.queued) > self.max_queued:
+            self.queued.popleft().cancel()
+
+        if not self._batching:
+            self._dispatch()
+
+        return job
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Jobs submitted inside the with block only start at its end, newest first
+        Otherwise idle workers take the first jobs submitted as soon as they are
+        """
+
+        batching: bool = self._batching
+        self._batching = True
+
+        try:
+            yield
+        finally:
+            self._batching = batching
+
+            if not batching:
+                self._dispatch()
+
+    def cancel(self, key: Hashable) -> None:
+        """ Drop the jobs of key which haven't been applied yet """
+
+        self.generations.pop(key, None)
+
+        for job in self.queued:
+            if job.key == key:
+                job.cancel()
+
+    def is_current(self, job: Job) -> bool:
+        """ Check if the result of a job is still wanted """
+
+        return not job.cancelled and self.generations.get(job.key) == job.generation
+
+    @property
+    def pending(self) -> int:
+        """ Amount of jobs not applied yet """
+
+        return len(self.queued) + self.in_flight
+
+    def _dispatch(self) -> None:
+        """ Start queued jobs while fewer than workers are in flight """
+
+        while self.queued and self.in_flight < self.workers:
+            job: Job = self.queued.pop()
+
+            if not self.is_current(job):
+                continue
+
+            if self.executor is None:
+                from concurrent.futures import ThreadPoolExecutor  # imported with the first job, not with the module
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='pipeline')
+
+            self.in_flight += 1
+            self.executor.submit(self._run, job)
+
+    def _run(self, job: Job) -> None:
+        """ Worker side of a job """
+
+        result: Any = None
+        error: Exception = None
+
+        if not job.cancelled:
+            try:
+                result = job.load(*job.args)
+            except Exception as exception:
+                error = exception
+
+        self.done.append((job, result, error))
+        self._wake()
+
+    def _wake(self) -> None:
+        """ Have the event loop drain the results (from a worker) """
+
+        if self.event_loop is None:
+            return
+
+        with self._lock:
+            if self._wake_scheduled:
+                return
+
+            self._wake_scheduled = True
+
+        self.event_loop.call_threadsafe(self._tick)
+
+    def _tick(self) -> None:
+        with self._lock:
+            self._wake_scheduled = False
+
+        if self.drain():
+            self._wake()  # over budget, the rest after input and rendering had their turn
+
+    def drain(self, budget: float = None) -> bool:
+        """
+        Apply the results of finished jobs on the calling (UI) thread for at most budget seconds
+        Errors raised by a load are raised here
+        Returns whether results are left
+        """
+
+        budget = self.budget if budget is None else budget
+        start: float = perf_counter()
+
+        while self.done:
+            job, result, error = self.done.popleft()
+            self.in_flight -= 1
+            self._dispatch()
+
+            if not self.is_current(job):
+                continue
+
+            self.generations.pop(job.key)
+
+            if error is not None:
+                raise error
+
+            job.apply(result)
+
+            if perf_counter() - start >= budget:
+                break
+
+        return bool(self.done)
+
+    def close(self) -> None:
+        """ Cancel everything and stop the workers (running jobs finish in the background) """
+
+        for job in self.queued:
+            job.cancel()
+
+        self.queued.clear()
+        self.generations.clear()
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+# databases of the worker threads
+_thread_local: local = local()
+
+
+def thread_database(path: str = 'focalboard.db') -> Database:
+    """
+    Database of the calling thread, opened on first use
+    Every worker queries through its own connection, a connection can only run one query at a time
+    """
+
+    databases: dict[str, Database] = _thread_local.__dict__.setdefault('databases', {})
+
+    if path not in databases:
+        databases[path] = Database(path)
+
+    return databases[path]
+
+
+class AsyncListWidget(ListWidget):
+    """
+    Virtualized list whose rows are loaded and rendered on the workers of a Pipeline, a page at a time
+    load_page(start, count) runs on a worker and returns the text of the items start to start + count
+    (see card_pages), it's rendered into a CellBuffer there as well - showing a page only copies its rows
+
+    Rows of pages which aren't loaded yet show placeholder
+    The visible pages and prefetch pages around them are requested, pages scrolled away from are cancelled
+    and (further than keep pages) dropped
+    """
+
+    def __init__(self, pipeline: Pipeline, count: int, load_page: Callable[[int, int], list[str]], page_size: int = 64,
+                 prefetch: int = 1, keep: int = 4, placeholder: str = '…', **kwargs: Any) -> None:
+        super().__init__(range(count), **kwargs)
+
+        self.pipeline: Pipeline = pipeline
+        self.load_page: Callable[[int, int], list[str]] = load_page
+        self.page_size: int = page_size
+        self.prefetch: int = prefetch
+        self.keep: int = keep
+        self.placeholder: str = placeholder
+
+        self.pages: dict[int, CellBuffer] = {}  # rendered pages, all of the current width
+        self.requested: dict[int, Job] = {}
+        self.page_columns: int = None  # width the pages are loaded and requested for
+
+    def set_count(self, count: int) -> None:
+        """ The amount of items changed, loaded pages are dropped """
+
+        self._drop_pages()
+        self.set_items(range(count))
+
+    def resize(self) -> None:
+        """ Pages are rendered for a width, a new width needs new pages """
+
+        columns: int = self.area[3]
+        if columns != self.page_columns:
+            self._drop_pages()  # requested ones too, they are rendered for the old width
+            self.page_columns = columns
+
+        super().resize()
+
+    def _drop_pages(self) -> None:
+        for page in self.requested:
+            self.pipeline.cancel((self.id, page))
+
+        self.pages.clear()
+        self.requested.clear()
+
+    def render_row(self, index: int, columns: int) -> tuple[str, int]:
+        return (self.placeholder if index < len(self.items) else ''), self.style
+
+    def _render_slot(self, slot: int, index: int) -> None:
+        """ Copy the row from its page, the placeholder if it isn't loaded """
+
+        page, row = divmod(index, self.page_size)
+        buffer: CellBuffer = self.pages.get(page)
+
+        if buffer is None or row >= buffer.rows:
+            super()._render_slot(slot, index)
+            return
+
+        self.ring_codes[slot][:] = buffer.codes[row]
+        self.ring_styles[slot][:] = buffer.styles[row]
+
+    def _render_page(self, page: int, columns: int) -> CellBuffer:
+        """ Load and render a page (on a worker) """
+
+        lines: list[str] = self.load_page(page * self.page_size, self.page_size)
+
+        buffer: CellBuffer = CellBuffer(len(lines), columns)
+        for row, line in enumerate(lines):
+            buffer.write(row, 0, fit_text(line, columns), self.style)
+
+        return buffer
+
+    def _show_page(self, page: int, buffer: CellBuffer) -> None:
+        """ A page arrived (on the UI thread), show its visible rows """
+
+        self.requested.pop(page, None)
+
+        if self.frame is None:
+            return
+
+        if buffer.columns != self.area[3]:
+            self._update_pages()  # resized while it was rendered, request it again
+            return
+
+        self.pages[page] = buffer
+        self.version += 1  # cached renders have placeholders instead of these rows
+
+        if self.dirty:
+            return
+
+        rows: int = len(self.ring_codes)
+        for row in range(max(self.offset, page * self.page_size) - self.offset, min(self.offset + rows, (page + 1) * self.page_size) - self.offset):
+            slot: int = (self.ring_start + row) % rows
+            self._render_slot(slot, self.offset + row)
+            self._show_slot(slot, row)
+
+    def _update_pages(self) -> None:
+        """ Request the pages around the visible rows, cancel and drop the ones far away """
+
+        rows: int = len(self.ring_codes)
+        first: int = self.offset // self.page_size
+        last: int = max(first, (self.offset + rows - 1) // self.page_size)
+        page_count: int = -(-len(self.items) // self.page_size)
+
+        for page in list(self.requested):
+            if not first - self.prefetch <= page <= last + self.prefetch:
+                self.pipeline.cancel((self.id, page))
+                del self.requested[page]
+
+        for page in list(self.pages):
+            if not first - self.keep <= page <= last + self.keep:
+                del self.pages[page]
+
+        # the newest jobs start first, so the visible pages are requested last (and started together at the end)
+        wanted: list[int] = [*range(last + self.prefetch, last, -1), *range(first - self.prefetch, first), *range(last, first - 1, -1)]
+        columns: int = self.area[3]
+
+        with self.pipeline.batch():
+            for page in wanted:
+                if not 0 <= page < page_count or page in self.pages:
+                    continue
+
+                job: Job = self.requested.get(page)
+                if job is not None and not job.cancelled:
+                    continue  # dropped by backpressure otherwise
+
+                self.requested[page] = self.pipeline.submit((self.id, page), self._render_page, partial(self._show_page, page), page, columns)
+
+    def render(self) -> None:
+        """ Request the pages to show first - also when the render comes from the cache and draw isn't called """
+
+        if self.dirty and self.frame is not None:
+            self._update_pages()
+
+        super().render()
+
+    def scroll(self, lines: int) -> None:
+        super().scroll(lines)
+
+        if self.frame is not None:
+            self._update_pages()
+
+
+
+def card_pages(board_id: str, format_card: Callable[[Block], str] = lambda card: card.title or 'Untitled',
+               path: str = 'focalboard.db') -> Callable[[int, int], list[str]]:
+    """
+    load_page of an AsyncListWidget showing the cards of a board (in creation order)
+    format_card runs on the worker too, so it can look into card.fields
+    """
+
+    def load_page(start: int, count: int) -> list[str]:
+        return [format_card(card) for card in thread_database(path).card_page(board_id, start, count)]
+
+    return load_page
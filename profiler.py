@@ -0,0 +1,84 @@
+from collections import deque
+from time import perf_counter
+from typing import Any
+
+
+class Profiler:
+    """
+    Records how long the stages of the main loop take, to find out what makes the UI stutter
+    Stages: read_input, mouse and keyboard (callback dispatch), layout, compose, render (diffing) and write
+
+    Instrumented code checks enabled before taking any time, so a disabled profiler costs one attribute lookup:
+
+        start: float = profiler.start()
+        ...
+        if start:
+            profiler.record('compose', start)
+
+    Samples are kept in a ring buffer of the last capacity samples
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.enabled: bool = False
+
+        # (stage, start, duration) in seconds, start is a perf_counter value
+        self.samples: deque[tuple[str, float, float]] = deque(maxlen=capacity)
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        self.samples.clear()
+
+    def start(self) -> float:
+        """ Return the start time of a stage, 0 if the profiler is disabled (see record) """
+
+        return perf_counter() if self.enabled else 0.0
+
+    def record(self, stage: str, start: float) -> None:
+        """ Record a stage which started at start (as returned by start) and ends now """
+
+        self.samples.append((stage, start, perf_counter() - start))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """ Per stage statistics of the samples in the ring buffer - count, mean, p50, p95 and max (in seconds) """
+
+        durations: dict[str, list[float]] = {}
+        for stage, start, duration in self.samples:
+            durations.setdefault(stage, []).append(duration)
+
+        summary: dict[str, dict[str, float]] = {}
+        for stage, values in durations.items():
+            values.sort()
+            summary[stage] = {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max': values[-1],
+            }
+
+        return summary
+
+    def export(self, path: str) -> None:
+        """
+        Write the samples to a file in the Chrome trace event format (chrome://tracing, Perfetto)
+        with the summary under 'summary'
+        """
+
+        import json
+
+        events: list[dict[str, Any]] = [
+            {'name': stage, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': 0, 'tid': 0}
+            for stage, start, duration in self.samples
+        ]
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'summary': self.summary()}, file)
+
+
+# profiler used by the instrumented code
+profiler: Profiler = Profiler()
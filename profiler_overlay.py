@@ -0,0 +1,47 @@
+from profiler import Profiler, profiler
+from widget import Widget
+
+
+class ProfilerWidget(Widget):
+    """
+    Table of the per stage timings of a profiler (in milliseconds)
+    Shown in an overlay by show_overlay, call refresh to update it (for example every second with EventLoop.call_every)
+    """
+
+    COLUMNS: tuple[str, ...] = ('count', 'mean', 'p50', 'p95', 'max')
+
+    def __init__(self, source: Profiler = profiler) -> None:
+        super().__init__(cache=None)  # changes on every refresh, nothing to reuse
+        self.source: Profiler = source
+
+    def refresh(self) -> None:
+        self.mark_dirty()
+
+    def draw(self) -> None:
+        top, left, rows, columns = self.frame.content_area()
+        chars = self.frame.chars
+
+        lines: list[str] = ['stage      ' + ''.join(f"{column:>8}" for column in self.COLUMNS)]
+        for stage, stats in sorted(self.source.summary().items()):
+            lines.append(f"{stage:<11}{stats['count']:>8}" + ''.join(f"{stats[column] * 1000:>8.3f}" for column in self.COLUMNS[1:]))
+
+        if not self.source.enabled:
+            lines.append('(disabled)')
+
+        for row in range(rows):
+            chars.write(top + row, left, (lines[row] if row < len(lines) else '')[:columns].ljust(columns))
+
+
+def show_overlay(frame_manager: 'FrameManager', source: Profiler = profiler) -> ProfilerWidget:
+    """ Open an overlay in the top right corner of the screen showing the profiler, returns its widget """
+
+    columns: int = min(frame_manager.char_grid.columns, 2 + 11 + 8 * len(ProfilerWidget.COLUMNS))
+    rows: int = min(frame_manager.char_grid.rows, 12)
+
+    overlay = frame_manager.open_overlay(rows, columns, (1, frame_manager.char_grid.columns - columns + 1))
+    overlay.add_border()
+
+    widget: ProfilerWidget = ProfilerWidget(source)
+    widget.attach(overlay)
+
+    return widget
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Hashable
+
+from cell_buffer import CellBuffer
+
+
+class RenderCache:
+    """
+    LRU cache of rendered cells - maps a key describing what was rendered to a CellBuffer
+    Widgets use (widget, content version, rows, columns, style) as the key, so redrawing an unchanged widget
+    in a size it had before (switching tabs or layouts back and forth, frames moving) is a copy instead of a render
+    Size is capped by memory (6 bytes per cell), least recently used entries are evicted first
+    """
+
+    # rough size of a cell in bytes - 4 for the code point, 2 for the style id
+    CELL_SIZE: int = 6
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024) -> None:
+        self.max_bytes: int = max_bytes
+        self.size: int = 0  # bytes used by all entries
+
+        self.entries: OrderedDict[Hashable, CellBuffer] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable) -> CellBuffer:
+        """ Return the cells cached under key (None if there are none), marking them as recently used """
+
+        buffer: CellBuffer = self.entries.get(key)
+
+        if buffer is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return buffer
+
+    def put(self, key: Hashable, buffer: CellBuffer) -> None:
+        """
+        Cache buffer under key, the buffer mustn't be modified afterwards
+        Least recently used entries are evicted until the cache fits into max_bytes, a buffer bigger than that isn't cached
+        """
+
+        cost: int = self.cost(buffer)
+
+        self.discard(key)
+        if cost > self.max_bytes:
+            return
+
+        self.entries[key] = buffer
+        self.size += cost
+
+        while self.size > self.max_bytes:
+            old_key, old_buffer = self.entries.popitem(last=False)
+            self.size -= self.cost(old_buffer)
+            self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        """ Remove an entry if it exists """
+
+        buffer: CellBuffer = self.entries.pop(key, None)
+
+        if buffer is not None:
+            self.size -= self.cost(buffer)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def cost(self, buffer: CellBuffer) -> int:
+        return buffer.rows * buffer.columns * self.CELL_SIZE
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+
+# cache shared by all widgets and frame borders
+render_cache: RenderCache = RenderCache()
@@ -0,0 +1,209 @@
+from array import array
+
+from cell_buffer import decode
+
+
+# color given as a name -> one of the 16 basic colors
+COLORS: dict[str, int] = {
+    'black': 0, 'red': 1, 'green': 2, 'yellow': 3, 'blue': 4, 'magenta': 5, 'cyan': 6, 'white': 7,
+    'bright_black': 8, 'bright_red': 9, 'bright_green': 10, 'bright_yellow': 11,
+    'bright_blue': 12, 'bright_magenta': 13, 'bright_cyan': 14, 'bright_white': 15,
+}
+
+# attribute -> SGR parameter turning it on
+ATTRIBUTES: dict[str, int] = {
+    'bold': 1, 'dim': 2, 'italic': 3, 'underline': 4, 'blink': 5, 'reverse': 7, 'strikethrough': 9,
+}
+
+# attribute -> SGR parameter turning it off (22 turns off both bold and dim)
+ATTRIBUTES_OFF: dict[str, int] = {
+    'bold': 22, 'dim': 22, 'italic': 23, 'underline': 24, 'blink': 25, 'reverse': 27, 'strikethrough': 29,
+}
+
+# style ids are stored in 'H' arrays
+MAX_STYLES: int = 1 << 16
+
+# a color is None (terminal default), 0-15 (basic), 16-255 (256 color palette) or (r, g, b) (truecolor)
+Color = None | int | tuple[int, int, int]
+
+
+def parse_color(color: str | int | tuple[int, int, int] | None) -> Color:
+    """ Convert a color name ('red', 'bright_blue'), '#rrggbb', palette index or (r, g, b) to a Color """
+
+    if color is None or isinstance(color, tuple):
+        return color
+
+    if isinstance(color, int):
+        if not 0 <= color <= 255:
+            raise ValueError(f"Color {color} out of range")
+        return color
+
+    if color.startswith('#') and len(color) == 7:
+        return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+    try:
+        return COLORS[color.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown color {color}")
+
+
+def color_parameters(color: Color, background: bool) -> str:
+    """ SGR parameters setting a foreground (or background) color """
+
+    if color is None:
+        return '49' if background else '39'
+
+    if isinstance(color, tuple):
+        return f"{48 if background else 38};2;{color[0]};{color[1]};{color[2]}"
+
+    if color < 8:
+        return str((40 if background else 30) + color)
+
+    if color < 16:
+        return str((100 if background else 90) + color - 8)
+
+    return f"{48 if background else 38};5;{color}"
+
+
+class Style:
+    """
+    Interned (flyweight) style of cells - colors and attributes
+    Use style() to get one, equal styles are the same object with the same id
+    Cells only store the id (see CellBuffer.styles), id 0 is the default style
+    Anything taking a style id takes a Style as well (it converts to its id through __index__)
+    """
+
+    __slots__ = ('id', 'fg', 'bg', 'attributes', 'parameters')
+
+    def __init__(self, id: int, fg: Color, bg: Color, attributes: frozenset[str]) -> None:
+        self.id: int = id
+        self.fg: Color = fg
+        self.bg: Color = bg
+        self.attributes: frozenset[str] = attributes
+
+        # SGR parameters setting this style from the default one
+        self.parameters: list[str] = [str(ATTRIBUTES[attribute]) for attribute in sorted(attributes)]
+        if fg is not None:
+            self.parameters.append(color_parameters(fg, False))
+        if bg is not None:
+            self.parameters.append(color_parameters(bg, True))
+
+    def __index__(self) -> int:
+        """ A style can be passed wherever a style id is expected """
+
+        return self.id
+
+    def __repr__(self) -> str:
+        return f"Style({self.id}, fg={self.fg}, bg={self.bg}, {', '.join(sorted(self.attributes))})"
+
+
+# all styles ever created, indexed by id
+styles: list[Style] = [Style(0, None, None, frozenset())]
+_interned: dict[tuple, Style] = {(None, None, frozenset()): styles[0]}
+
+# (from id << 16 | to id) -> shortest SGR sequence switching between the two styles
+_transitions: dict[int, str] = {}
+
+
+def style(fg: str | int | tuple[int, int, int] = None, bg: str | int | tuple[int, int, int] = None, **attributes: bool) -> Style:
+    """
+    Return the style with colors fg and bg (see parse_color) and attributes (bold=True, underline=True, ...)
+    Styles are interned - creating an existing style again returns the same object
+    """
+
+    unknown: set[str] = attributes.keys() - ATTRIBUTES.keys()
+    if unknown:
+        raise ValueError(f"Unknown attributes {', '.join(sorted(unknown))}")
+
+    key: tuple = (parse_color(fg), parse_color(bg), frozenset(name for name, on in attributes.items() if on))
+
+    interned: Style = _interned.get(key)
+    if interned is None:
+        if len(styles) >= MAX_STYLES:
+            raise Exception("Too many styles.")
+
+        interned = _interned[key] = Style(len(styles), *key)
+        styles.append(interned)
+
+    return interned
+
+
+def transition(current: int, target: int) -> str:
+    """
+    Shortest SGR sequence switching the terminal from style id current to target ('' if they're the same)
+    Either a reset followed by the whole target style, or only the parameters that differ
+    current None means the state of the terminal is unknown, so it's reset. Cached per pair
+    """
+
+    if current == target:
+        return ''
+
+    if current is None:
+        return '\x1b[0' + ''.join(';' + parameter for parameter in styles[target].parameters) + 'm'
+
+    key: int = current << 16 | target
+    sequence: str = _transitions.get(key)
+
+    if sequence is None:
+        old: Style = styles[current]
+        new: Style = styles[target]
+
+        # from scratch
+        reset: str = '\x1b[0' + ''.join(';' + parameter for parameter in new.parameters) + 'm'
+
+        # only the difference
+        parameters: list[str] = []
+        turned_off: set[str] = old.attributes - new.attributes
+        for attribute in sorted(turned_off):
+            parameter: str = str(ATTRIBUTES_OFF[attribute])
+            if parameter not in parameters:
+                parameters.append(parameter)
+
+        turned_on: set[str] = new.attributes - old.attributes
+        if turned_off & {'bold', 'dim'}:
+            turned_on |= new.attributes & {'bold', 'dim'}  # 22 turned off both
+        parameters.extend(str(ATTRIBUTES[attribute]) for attribute in sorted(turned_on))
+
+        if old.fg != new.fg:
+            parameters.append(color_parameters(new.fg, False))
+        if old.bg != new.bg:
+            parameters.append(color_parameters(new.bg, True))
+
+        difference: str = '\x1b[' + ';'.join(parameters) + 'm'
+
+        sequence = _transitions[key] = min(reset, difference, key=len)
+
+    return sequence
+
+
+def encode(codes: array, style_ids: array, start: int, end: int, current: int) -> tuple[str, int]:
+    """
+    Encode cells start to end of a row (code points and style ids) to text with SGR sequences
+    A sequence is emitted only where the style changes between cells (run-length encoding),
+    current is the style the terminal is in before the cells
+    Returns the text and the style the terminal is in after it
+    """
+
+    first: int = style_ids[start]
+
+    # a single style - the common case
+    if style_ids[start:end].count(first) == end - start:
+        return transition(current, first) + decode(codes[start:end]), first
+
+    pieces: list[str] = []
+    column: int = start
+
+    while column < end:
+        style_id: int = style_ids[column]
+        run_end: int = column + 1
+        while run_end < end and style_ids[run_end] == style_id:
+            run_end += 1
+
+        if style_id != current:
+            pieces.append(transition(current, style_id))
+            current = style_id
+
+        pieces.append(decode(codes[column:run_end]))
+        column = run_end
+
+    return ''.join(pieces), current
@@ -1,16 +1,33 @@
-from os import get_terminal_size
+import os
+import signal
+from os import get_terminal_size, terminal_size
+from select import select
+from selectors import DefaultSelector, EVENT_READ
 from sys import stdout
+from time import monotonic
 from typing import Callable, Any 
 
-class Terminal:
-    """ 
-    Class that holds useful information about the terminal
-    Currently only size, and resize check
+from callbacks import invoke
+from profiler import profiler
+
+
+class TerminalBackend:
     """
+    What the frame manager and the event loop need from a terminal - size, resize events, output and frame pacing
+    Implemented by Terminal (a real tty) and headless.HeadlessTerminal (an in-memory screen)
 
-    def __init__(self) -> None:
-        self.size: terminal_size = get_terminal_size()
-        self.listeners: set[Callable[..., Any]] = set() 
+    Subclasses implement write, flush, pending and the resize methods (fileno, handle_resize_signal, timeout, update)
+    and call resized when the size changes
+    """
+
+    def __init__(self, rows: int, columns: int, max_fps: float = 60) -> None:
+        # None lets a subclass find out the size when it's first needed
+        self.size: terminal_size = None if rows is None else terminal_size((columns, rows))
+        self.listeners: set[Callable[..., Any]] = set()
+
+        # frame pacing
+        self.frame_interval: float = 1 / max_fps
+        self.last_frame: float = float('-inf')
 
     @property
     def columns(self) -> int:
@@ -24,57 +41,281 @@ class Terminal:
 
         return self.size[1]
 
+    def on_resize(self, callback: Callable[[int, int], Any]) -> None:
+        """ Subscribes callback function to resize event, it's called with the new rows and columns """
+
+        self.listeners.add(callback)
+
+    def unsubsribe(self, callback: Callable[..., Any]) -> None:
+        """ Unsubscribe a function from resize event """
+
+        self.listeners.remove(callback)
+
+    def resized(self, size: terminal_size) -> None:
+        """ Update the size and call listeners if it changed """
+
+        if size != self.size:  # check if old size is different
+            self.size = size  # update size
+
+            # call listeners with the new size
+            for callback in list(self.listeners):
+                invoke(callback, self.rows, self.columns)
+
+    def fileno(self) -> int:
+        """ Return the fd which becomes readable on terminal resize (for select/selectors) """
+
+        raise NotImplementedError
+
+    def handle_resize_signal(self) -> None:
+        """ Call when fileno() is readable """
+
+        raise NotImplementedError
+
+    def timeout(self) -> float:
+        """ Return the seconds until update should be called, None if there's nothing pending """
+
+        return None
+
+    def update(self) -> None:
+        """ Handle a pending resize """
+
+        pass
+
+    def write(self, buf: str) -> int:
+        """ Queue a string (usually a whole frame) for output, returns the amount of bytes queued """
+
+        raise NotImplementedError
+
+    def flush(self, block: bool = False) -> bool:
+        """ Write buffered output, returns whether everything was written """
+
+        raise NotImplementedError
+
+    @property
+    def pending(self) -> int:
+        """ Return the amount of bytes still waiting to be written """
+
+        return 0
+
+    def ready(self) -> bool:
+        """
+        Check if a new frame should be written
+        False if the previous frame isn't fully written yet (the terminal is falling behind)
+        or if less than frame_interval passed since the previous frame (frame rate cap)
+        """
+
+        if self.pending and not self.flush():
+            return False
+
+        return monotonic() - self.last_frame >= self.frame_interval
+
+    def close(self) -> None:
+        """ Write everything left and release the terminal """
+
+        self.flush(block=True)
+
+
+class Terminal(TerminalBackend):
+    """ 
+    Backend of a real terminal (tty)
+    Size, resize check and buffered output
+
+    Resizes are detected through SIGWINCH, which writes to a self-pipe
+    The read end is exposed via fileno(), so the terminal can be registered in a selector next to stdin
+    Bursts of resize signals (dragging a window edge) are debounced into one update after resize_delay seconds
+    """
+
+    def __init__(self, fd: int = None, max_fps: float = 60, resize_delay: float = 0.05) -> None:
+        # output goes through a separate non-blocking fd, so a slow terminal can't stall the program
+        fd = stdout.fileno() if fd is None else fd
+        self.fd: int = self._open_output(fd)
+        self.owns_fd: bool = self.fd != fd
+
+        super().__init__(None, None, max_fps)  # the size is probed when first needed
+
+        # resize detection
+        self.resize_delay: float = resize_delay
+        self.resize_deadline: float = None  # when the pending resize should be handled
+        self._resize_pipe: tuple[int, int] = os.pipe()
+        for pipe_fd in self._resize_pipe:
+            os.set_blocking(pipe_fd, False)
+        self._previous_sigwinch: Any = signal.signal(signal.SIGWINCH, self._on_sigwinch)
+
+        # encoded bytes waiting to be written and how many of them are already written
+        self.out_buffer: bytearray = bytearray()
+        self.out_offset: int = 0
+
+    @property
+    def size(self) -> terminal_size:
+        """ (columns, rows) of the terminal, the tty is only asked on first use and after resizes """
+
+        if self._size is None:
+            self._size = get_terminal_size(self.fd)
+
+        return self._size
+
+    @size.setter
+    def size(self, size: terminal_size) -> None:
+        self._size = size
+
+    @staticmethod
+    def _open_output(fd: int) -> int:
+        """
+        Open the terminal behind fd again for non-blocking writing
+        A new open is used as setting O_NONBLOCK on fd itself would also affect stdin (same open file)
+        If fd isn't a terminal it's used as it is, with blocking writes
+        """
+
+        try:
+            return os.open(os.ttyname(fd), os.O_WRONLY | os.O_NONBLOCK | os.O_NOCTTY)
+        except OSError:
+            return fd
+
+    def fileno(self) -> int:
+        """ Return the fd which becomes readable on terminal resize (for select/selectors) """
+
+        return self._resize_pipe[0]
+
+    def _on_sigwinch(self, signum: int, frame: Any) -> None:
+        """ SIGWINCH handler, only wakes up whoever waits on fileno() """
+
+        try:
+            os.write(self._resize_pipe[1], b'\0')
+        except BlockingIOError:
+            pass  # pipe is full, a wake up is already pending
+
+    def handle_resize_signal(self) -> None:
+        """
+        Call when fileno() is readable
+        Drains the self-pipe and (re)starts the debounce timer
+        """
+
+        try:
+            while os.read(self._resize_pipe[0], 512):
+                pass
+        except BlockingIOError:
+            pass
+
+        self.resize_deadline = monotonic() + self.resize_delay
+
+    def timeout(self) -> float:
+        """
+        Return the seconds until a pending resize should be handled by update
+        None if there's no pending resize (wait for input/signals indefinitely)
+        """
+
+        if self.resize_deadline is None:
+            return None
+
+        return max(0, self.resize_deadline - monotonic())
+
     def update(self) -> None:
         """ 
-        Check for terminal size update 
-        Update size and call listeners if so
+        Handle a pending resize once the debounce time has passed
+        Update size and call listeners if it changed
+        Cheap to call often, the terminal size is only queried after a resize signal
         """
 
-        size = get_terminal_size()  # get current terminal size
-        
-        if size != self.size:  # check if old size is different
-            self.size = size  # update size
-            
-            # call listeners
-            for callback in self.listeners:
-                callback()
+        if self.resize_deadline is None or monotonic() < self.resize_deadline:
+            return
 
+        self.resize_deadline = None
+        self.resized(get_terminal_size(self.fd))  # get current terminal size
 
-    def on_resize(self, callback: Callable[..., Any]) -> None:
-        """ Subscribes callback function to resize event """
-        # TODO: pass args
+    def write(self, buf: str) -> int:
+        """
+        Queue a string (usually a whole frame) and write as much of it as possible without blocking
+        What isn't written is kept and resumed by the next flush or write
+        Returns the amount of bytes queued
+        """
 
-        self.listeners.add(callback)
+        start: float = profiler.start()
 
-    def unsubsribe(self, callback: Callable[..., Any]) -> None:
-        """ Unsubscribe a function from resize event """
+        data: bytes = buf.encode()  # encode once, the bytes are only copied into the buffer
+        self.out_buffer += data
+        self.last_frame = monotonic()
+        self.flush()
 
-        self.listeners.remove(callback)
+        if start:
+            profiler.record('write', start)
 
-    def write(self, buf: str) -> None:
-        """ Write a string to stdout """
-        if len(buf) != stdout.write(buf):
-            # TODO: Handle partial write and add bool if to handle or throw an exception
-            raise Exception("Partial write encountered")
+        return len(data)
 
+    def flush(self, block: bool = False) -> bool:
+        """
+        Write buffered output to the terminal
+        Partial writes and a full terminal (EAGAIN) are handled by resuming from where the write stopped
+        Unless block is set, returns as soon as the terminal can't take more
+        Returns whether everything was written
+        """
 
+        stdout.flush()  # anything printed normally has to come out first
 
-if __name__ == '__main__':
+        view: memoryview = memoryview(self.out_buffer)
 
-    term: Terminal = Terminal()
+        try:
+            while self.out_offset < len(self.out_buffer):
+                try:
+                    self.out_offset += os.write(self.fd, view[self.out_offset:])
+                except BlockingIOError:
+                    if not block:
+                        return False
 
-    def resize():
-        print(f"New size: {term.rows};{term.columns}")
+                    select([], [self.fd], [])  # wait until the terminal can take more
+        finally:
+            view.release()
 
-    term.on_resize(resize)
+        # everything is written, reuse the buffer for the next frame
+        self.out_buffer.clear()
+        self.out_offset = 0
 
+        return True
 
-    while True:
-        term.update()
+    @property
+    def pending(self) -> int:
+        """ Return the amount of bytes still waiting to be written """
+
+        return len(self.out_buffer) - self.out_offset
+
+    def close(self) -> None:
+        """ Write everything left, close the output fd and the self-pipe and give SIGWINCH back to its previous handler """
+
+        self.flush(block=True)
 
+        if self.owns_fd:
+            os.close(self.fd)
 
+        # a terminal created later may have taken over the signal since, it keeps it
+        if signal.getsignal(signal.SIGWINCH) == self._on_sigwinch:
+            previous: Any = self._previous_sigwinch
 
+            # skip terminals closed in the meantime (closed out of order)
+            while isinstance(getattr(previous, '__self__', None), Terminal) and previous.__self__._resize_pipe is None:
+                previous = previous.__self__._previous_sigwinch
 
+            signal.signal(signal.SIGWINCH, previous)
 
-        
+        for pipe_fd in self._resize_pipe:
+            os.close(pipe_fd)
+        self._resize_pipe = None
 
+
+
+if __name__ == '__main__':
+
+    term: Terminal = Terminal()
+
+    def resize(rows: int, columns: int):
+        print(f"New size: {rows};{columns}")
+
+    term.on_resize(resize)
+
+    selector: DefaultSelector = DefaultSelector()
+    selector.register(term, EVENT_READ)
+
+    # sleeps until the terminal is resized, one update per burst of resizes
+    while True:
+        for key, events in selector.select(term.timeout()):
+            term.handle_resize_signal()
+
+        term.update()
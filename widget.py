@@ -1,5 +1,259 @@
+from array import array
+from itertools import count
+from operator import index
+from typing import Any, Callable, Hashable, Sequence
+
+from cell_buffer import BLANK, CODE_TYPE, CellBuffer, text_cells
+from frame import Frame
+from render_cache import RenderCache, render_cache
+from style import Style
+from unicode_width import fit_text
 
 
 class Widget:
-    def __init__(self):
+    """
+    Base of everything shown inside a frame
+    A widget draws into the cells of its frame (inside the border, see Frame.content_area)
+    Widgets marked dirty are drawn again by the frame manager before it composes their frame
+
+    What a widget draws is cached under (widget, version, rows, columns, style) in a RenderCache
+    version changes whenever the content does (mark_dirty), so a redraw after a resize or reattach
+    to a size seen before (switching tabs or layouts) is copied from the cache instead of drawn
+    """
+
+    # unique ids of widgets (ids of objects can be reused)
+    _ids = count()
+
+    def __init__(self, style: int | Style = 0, cache: RenderCache = render_cache) -> None:
+        self.frame: Frame = None
+        self.dirty: bool = True
+
+        self.id: int = next(self._ids)
+        self.version: int = 0  # changes with the content
+        self.style: int = index(style)  # the id, it's part of the cache key
+        self.cache: RenderCache = cache  # None disables caching
+
+    def attach(self, frame: Frame) -> None:
+        """ Show the widget in a frame """
+
+        if self.frame is not None:
+            self.frame.widget = None
+
+        self.frame = frame
+        frame.widget = self
+        self.resize()
+
+    def mark_dirty(self, changed: bool = True) -> None:
+        """
+        Redraw the whole widget on the next compose
+        changed means the content changed - False only repaints (after a resize for example), which can hit the cache
+        """
+
+        if changed:
+            self.version += 1
+
+        self.dirty = True
+
+    def resize(self) -> None:
+        """ Called by the frame when its size changes """
+
+        self.mark_dirty(changed=False)
+
+    def cache_key(self) -> Hashable:
+        """ Key of the current content and geometry in the render cache, subclasses add their view state """
+
+        top, left, rows, columns = self.frame.content_area()
+        return self.id, self.version, rows, columns, self.style
+
+    def render(self) -> None:
+        """ Draw the widget into its frame if it's dirty, copying it from the render cache if possible """
+
+        if not self.dirty or self.frame is None:
+            return
+
+        self.dirty = False
+
+        if self.cache is None:
+            self.draw()
+            return
+
+        top, left, rows, columns = self.frame.content_area()
+        key: Hashable = self.cache_key()
+        cached: CellBuffer = self.cache.get(key)
+
+        if cached is not None:
+            self.frame.chars.blit(cached, top, left)
+            return
+
+        self.draw()
+        self.cache.put(key, self.frame.chars.crop(top, left, rows, columns))
+
+    def draw(self) -> None:
+        """ Draw the whole widget, implemented by subclasses """
+
         pass
+
+
+class ListWidget(Widget):
+    """
+    Virtualized list - only the rows visible in the frame are ever rendered
+    items can be any sequence (len and indexing), for example a lazily loaded list of 50k cards
+
+    Rendered rows are kept in a ring of row buffers, one per visible row
+    Scrolling by less than a screen rotates the ring and scrolls the frame (the terminal scrolls too
+    if the frame spans its whole width), so only the newly visible rows are rendered - the cost of a scroll
+    doesn't depend on the amount of items
+    """
+
+    def __init__(self, items: Sequence[Any] = (), format_item: Callable[[Any], str] = str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+
+        self.items: Sequence[Any] = items
+        self.format_item: Callable[[Any], str] = format_item
+        self.offset: int = 0  # index of the item in the top row
+
+        # ring of rendered rows (code points and styles of each row)
+        self.ring_codes: list[array] = []
+        self.ring_styles: list[array] = []
+        self.ring_start: int = 0  # slot of the top visible row
+
+    @property
+    def area(self) -> tuple[int, int, int, int]:
+        """ (top, left, rows, columns) of the frame the items are drawn in """
+
+        return self.frame.content_area()
+
+    def set_items(self, items: Sequence[Any]) -> None:
+        """ Show other items, keeps the offset if possible """
+
+        self.items = items
+        self.offset = max(0, min(self.offset, len(items) - self.area[2])) if self.frame is not None else 0
+        self.mark_dirty()
+
+    def resize(self) -> None:
+        """ Allocate a row buffer for every visible row """
+
+        top, left, rows, columns = self.area
+        self.ring_codes = [array(CODE_TYPE, [BLANK]) * columns for row in range(rows)]
+        self.ring_styles = [array('H', [0]) * columns for row in range(rows)]
+        self.ring_start = 0
+        self.offset = max(0, min(self.offset, len(self.items) - rows))
+        self.mark_dirty(changed=False)
+
+    def cache_key(self) -> Hashable:
+        return super().cache_key(), self.offset
+
+    def render_row(self, index: int, columns: int) -> tuple[str, int]:
+        """ Text and style of the row of item index, cut and padded to columns. Override for custom rows """
+
+        if index >= len(self.items):
+            return '', self.style
+
+        return self.format_item(self.items[index]), self.style
+
+    def _render_slot(self, slot: int, index: int) -> None:
+        """ Render an item into a slot of the ring, reusing its buffers """
+
+        columns: int = len(self.ring_codes[slot])
+        text, style = self.render_row(index, columns)
+
+        self.ring_codes[slot][:] = text_cells(fit_text(text, columns))
+        self.ring_styles[slot][:] = array('H', [style]) * columns
+
+    def _show_slot(self, slot: int, row: int) -> None:
+        """ Copy a slot to a visible row of the frame """
+
+        top, left, rows, columns = self.area
+        chars = self.frame.chars
+
+        chars.codes[top + row][left:left + columns] = self.ring_codes[slot]
+        chars.styles[top + row][left:left + columns] = self.ring_styles[slot]
+        chars.dirty_rows.add(top + row)
+
+    def draw(self) -> None:
+        """ Render every visible row """
+
+        rows: int = len(self.ring_codes)
+
+        for row in range(rows):
+            slot: int = (self.ring_start + row) % rows
+            self._render_slot(slot, self.offset + row)
+            self._show_slot(slot, row)
+
+    def scroll(self, lines: int) -> None:
+        """ Scroll by lines (down the list if positive), clamped to the items """
+
+        rows: int = len(self.ring_codes)
+        offset: int = max(0, min(self.offset + lines, len(self.items) - rows))
+        lines = offset - self.offset
+
+        if lines == 0:
+            return
+
+        self.offset = offset
+
+        if self.dirty or abs(lines) >= rows:
+            self.mark_dirty(changed=False)  # everything changes anyway, the items are the same though
+            return
+
+        # the slots of rows scrolled out become the slots of the rows scrolled in
+        self.ring_start = (self.ring_start + lines) % rows
+
+        top, left, rows, columns = self.area
+        self.frame.scroll(lines, top, top + rows)
+
+        exposed: range = range(rows - lines, rows) if lines > 0 else range(-lines)
+        for row in exposed:
+            slot: int = (self.ring_start + row) % rows
+            self._render_slot(slot, self.offset + row)
+            self._show_slot(slot, row)
+
+    def scroll_to(self, index: int) -> None:
+        """ Scroll so item index is visible """
+
+        rows: int = len(self.ring_codes)
+
+        if index < self.offset:
+            self.scroll(index - self.offset)
+        elif index >= self.offset + rows:
+            self.scroll(index - self.offset - rows + 1)
+
+
+class TableWidget(ListWidget):
+    """
+    Virtualized table - a ListWidget whose rows are split into columns
+    columns is a list of (title, width, getter), getter turns an item into the text of the cell
+    The first visible row is a header with the titles
+    """
+
+    def __init__(self, items: Sequence[Any] = (), columns: list[tuple[str, int, Callable[[Any], str]]] = (), **kwargs: Any) -> None:
+        super().__init__(items, **kwargs)
+
+        self.columns: list[tuple[str, int, Callable[[Any], str]]] = list(columns)
+
+    def _line(self, cells: list[str]) -> str:
+        return ' '.join(fit_text(cell, width) for cell, (title, width, getter) in zip(cells, self.columns))
+
+    @property
+    def area(self) -> tuple[int, int, int, int]:
+        """ Rows below the header """
+
+        top, left, rows, columns = self.frame.content_area()
+        return top + 1, left, max(0, rows - 1), columns
+
+    def render_row(self, index: int, columns: int) -> tuple[str, int]:
+        if index >= len(self.items):
+            return '', self.style
+
+        item: Any = self.items[index]
+        return self._line([str(getter(item)) for title, width, getter in self.columns]), self.style
+
+    def draw(self) -> None:
+        """ Render the header and every visible row """
+
+        top, left, rows, columns = self.frame.content_area()
+
+        if rows:
+            self.frame.chars.write(top, left, fit_text(self._line([title for title, width, getter in self.columns]), columns), self.style)
+
+        super().draw()